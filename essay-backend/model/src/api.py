@@ -1,26 +1,143 @@
+import asyncio
+import hashlib
+import json
 import os
-import re
+import secrets
+import time
 from datetime import datetime
-from typing import Dict, List
+from typing import Any, AsyncIterator, Dict, List, Sequence, Tuple
 from uuid import uuid4
 
-import torch
-from fastapi import FastAPI, HTTPException, status
+import numpy as np
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 
-from src.data_loader import clean_essay
-from src.dataset import Vocab
-from src.deep_model import EssayCNNBiLSTM
-from src.storage import append_grade_record
+from src.batching import MicroBatcher
+from src.cache import GradeCache
+from src.cascade import FastGrader, needs_deep
+from src.executor import InferenceExecutor, QueueFullError
+from src.inference import OnnxBackend, TorchBackend, load_backend
+from src.jobs import JobRunner, JobStore
+from src.long_doc import WindowPlanner, aggregate
+from src.metrics import CONTENT_TYPE, MetricsMiddleware, Registry, gauges_from_stats
+from src.near_dup import NearDupIndex, NearDupMatch
+from src.registry import ModelRegistry, ModelSpec, load_manifest
+from src.scoring import grade_letter_for, scale_score
+from src.startup import StartupTracker
+from src.storage import GroupCommitWriter, open_grade_store
+from src.text_analysis import AnalyzedText, analyze_essay
+from src.vocab import pad_ids
 
+# "torch" serves MODEL_PATH; "onnx" serves ONNX_MODEL_PATH with ONNX Runtime and never imports torch
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
 MODEL_PATH = os.getenv("MODEL_PATH", "models/deep_essay_grader.pt")
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "models/deep_essay_grader.onnx")
+# "int8" serves a dynamically quantized CPU model (see src/quantize.py)
+MODEL_PRECISION = os.getenv("MODEL_PRECISION", "float32").lower()
 MAX_SEQ_LEN = int(os.getenv("MAX_SEQ_LEN", "300"))
+# "truncate" scores the first MAX_SEQ_LEN tokens; "window" scores the full essay as overlapping
+# LONG_DOC_WINDOW-token windows every LONG_DOC_STRIDE tokens (see src/long_doc.py)
+LONG_DOC_MODE = os.getenv("LONG_DOC_MODE", "truncate").lower()
+LONG_DOC_WINDOW = int(os.getenv("LONG_DOC_WINDOW", str(MAX_SEQ_LEN)))
+LONG_DOC_STRIDE = int(os.getenv("LONG_DOC_STRIDE", str(max(1, LONG_DOC_WINDOW * 2 // 3))))
+# Per-essay window cap; LONG_DOC_BUDGET_MS further caps it by the measured cost per window (0 = off).
+# With a budget, essays longer than one window are scored afresh rather than cached.
+LONG_DOC_MAX_WINDOWS = int(os.getenv("LONG_DOC_MAX_WINDOWS", "8"))
+LONG_DOC_BUDGET_MS = float(os.getenv("LONG_DOC_BUDGET_MS", "0"))
+# Optional JSON manifest of per-prompt models (see src/registry.py); unlisted assignments use the default model
+MODEL_MANIFEST_PATH = os.getenv("MODEL_MANIFEST_PATH") or None
+# Memory budget for loaded per-prompt models; least recently used ones are unloaded beyond it (0 = unlimited)
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+# Required in the X-Admin-Token header of /api/admin requests; the admin API is disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN") or None
+DEFAULT_MODEL = "default"
+# Optional fast-tier grader (see src/cascade.py): default-model essays it is confident about skip the
+# deep model; CASCADE_MAX_STD overrides the spread threshold calibrated into the file
+CASCADE_MODEL_PATH = os.getenv("CASCADE_MODEL_PATH") or None
+CASCADE_MAX_STD = float(os.getenv("CASCADE_MAX_STD")) if os.getenv("CASCADE_MAX_STD") else None
+# Raw points around a grade-letter cut-off within which essays still go to the deep model
+CASCADE_MARGIN = float(os.getenv("CASCADE_MARGIN", "1.0"))
+# Near-duplicate detection per assignment (see src/near_dup.py): "flag" marks submissions close to an
+# earlier one in the response metadata; "reuse" also returns that earlier score without grading again
+NEAR_DUP_MODE = os.getenv("NEAR_DUP_MODE", "off").lower()
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+# Essays kept across all assignments, least recently matched evicted first (about 2 KB each)
+NEAR_DUP_MAX_ENTRIES = int(os.getenv("NEAR_DUP_MAX_ENTRIES", "50000"))
+NEAR_DUP_NUM_PERM = int(os.getenv("NEAR_DUP_NUM_PERM", "128"))
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "16"))
+NEAR_DUP_SHINGLE_SIZE = int(os.getenv("NEAR_DUP_SHINGLE_SIZE", "3"))
+# Restored on start-up and written on shutdown when set
+NEAR_DUP_SNAPSHOT_PATH = os.getenv("NEAR_DUP_SNAPSHOT_PATH") or None
+# Accept connections (liveness) before the model is loaded; /readyz reports when it is warm
+FAST_START = os.getenv("FAST_START", "0") == "1"
+WARMUP_TEXT = "A short warm-up essay that exercises tokenization and one model forward pass before traffic."
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*")
-GRADE_STORE_PATH = os.getenv("GRADE_STORE_PATH", "data/grades.json")
+GRADE_STORE_PATH = os.getenv("GRADE_STORE_PATH", "data/grades.db")
+GRADE_STORE_LEGACY_PATH = os.getenv("GRADE_STORE_LEGACY_PATH", "data/grades.json")
+GRADE_COMMIT_WINDOW_MS = float(os.getenv("GRADE_COMMIT_WINDOW_MS", "2"))
+GRADE_COMMIT_MAX_BATCH = int(os.getenv("GRADE_COMMIT_MAX_BATCH", "256"))
+GRADE_STORE_SYNC = os.getenv("GRADE_STORE_SYNC", "batch")
+GRADE_STORE_SYNC_INTERVAL = float(os.getenv("GRADE_STORE_SYNC_INTERVAL", "1.0"))
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0")) or None
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "512"))
+GRADE_CACHE_SIZE = int(os.getenv("GRADE_CACHE_SIZE", "4096"))
+GRADE_CACHE_MAX_BYTES = int(os.getenv("GRADE_CACHE_MAX_BYTES", "0"))
+GRADE_CACHE_TTL = float(os.getenv("GRADE_CACHE_TTL", "3600"))
+GRADE_CACHE_PATH = os.getenv("GRADE_CACHE_PATH") or None
+BULK_CHUNK_SIZE = max(1, int(os.getenv("BULK_CHUNK_SIZE", "32")))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "2000"))
+# Durable grading jobs (see src/jobs.py): essays are graded JOB_BATCH_SIZE at a time in the background
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "data/jobs.db")
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", str(BULK_CHUNK_SIZE)))
+JOB_MAX_ITEMS = int(os.getenv("JOB_MAX_ITEMS", "50000"))
+# Claimed essays return to the queue this long after a worker dies mid-batch
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_STREAM_INTERVAL = float(os.getenv("JOB_STREAM_INTERVAL", "0.5"))
+
+if LONG_DOC_MODE not in ("truncate", "window"):
+    raise ValueError(f"Unsupported LONG_DOC_MODE '{LONG_DOC_MODE}'. Use 'truncate' or 'window'.")
+if NEAR_DUP_MODE not in ("off", "flag", "reuse"):
+    raise ValueError(f"Unsupported NEAR_DUP_MODE '{NEAR_DUP_MODE}'. Use 'off', 'flag' or 'reuse'.")
 
 app = FastAPI(title="Essay Grader API", version="0.1.0")
 
+metrics = Registry()
+grade_stage_seconds = metrics.histogram(
+    "grade_stage_seconds",
+    "Time spent in each stage of /api/grade (analyze covers cleaning, encoding and text stats in one pass; "
+    "inference covers batch queueing and the model forward).",
+    ("stage",),
+)
+grade_cache_lookups = metrics.counter("grade_cache_lookups_total", "Grade cache lookups by result.", ("result",))
+grade_requests_in_flight = metrics.gauge("grade_requests_in_flight", "/api/grade requests currently being graded.")
+model_forward_seconds = metrics.histogram("model_forward_seconds", "Model forward pass latency per batch.")
+model_batch_size = metrics.histogram(
+    "model_batch_size", "Essays per model forward pass.", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+grade_cascade_routes = metrics.counter(
+    "grade_cascade_routes_total", "Essays scored by each cascade tier (fast or deep).", ("tier",)
+)
+grade_near_duplicates = metrics.counter(
+    "grade_near_duplicates_total", "Submissions matching an earlier one in the same assignment, by action.", ("action",)
+)
+grade_store_write_seconds = metrics.histogram(
+    "grade_store_write_seconds", "Time for save_grade to durably commit a record."
+)
+
+app.add_middleware(
+    MetricsMiddleware,
+    requests=metrics.counter("http_requests_total", "HTTP requests by method, route and status.", ("method", "route", "status")),
+    duration=metrics.histogram("http_request_duration_seconds", "HTTP request latency.", ("method", "route")),
+    in_flight=metrics.gauge("http_requests_in_flight", "HTTP requests currently being served."),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[origin.strip() for origin in ALLOWED_ORIGINS.split(",")] if ALLOWED_ORIGINS != "*" else ["*"],
@@ -48,6 +165,10 @@ class GradeResponse(BaseModel):
     metadata: Dict[str, float | int | str]
 
 
+class BatchGradeRequest(BaseModel):
+    items: List[GradeRequest]
+
+
 class GradeRecordRequest(BaseModel):
     student_name: str = Field(..., min_length=1)
     assignment_id: str = Field(..., min_length=1)
@@ -65,23 +186,45 @@ class GradeRecordResponse(BaseModel):
     feedback: str
 
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model: EssayCNNBiLSTM | None = None
-vocab: Vocab | None = None
+class GradeRecordPage(BaseModel):
+    items: List[GradeRecordResponse]
+    next_cursor: str | None = None
 
 
-def analyze_text_stats(text: str) -> Dict[str, float | int]:
-    words = re.findall(r"[a-zA-Z']+", text)
-    sentences = [s for s in re.split(r"[.!?]+", text) if s.strip()]
-    unique_words = len(set(words)) if words else 0
+class ModelReloadRequest(BaseModel):
+    model_path: str | None = None
+    onnx_path: str | None = None
+    backend: str | None = None
+    precision: str | None = None
+    wait: bool = False
 
-    return {
-        "word_count": len(words),
-        "sentence_count": len(sentences),
-        "avg_sentence_length": (len(words) / len(sentences)) if sentences else len(words),
-        "lexical_diversity": (unique_words / len(words)) if words else 0.0,
-        "char_count": len(text),
-    }
+
+backend: TorchBackend | OnnxBackend | None = None
+fast_grader: FastGrader | None = None
+near_dup: NearDupIndex | None = None
+near_dup_restore_error: str | None = None
+grade_writer: GroupCommitWriter | None = None
+job_runner: JobRunner | None = None
+
+prepare_task: asyncio.Task | None = None
+
+startup = StartupTracker()
+startup.mark("imported")
+
+grade_cache = GradeCache(
+    max_entries=GRADE_CACHE_SIZE,
+    max_bytes=GRADE_CACHE_MAX_BYTES,
+    ttl_seconds=GRADE_CACHE_TTL,
+    disk_path=GRADE_CACHE_PATH,
+)
+
+window_planner = (
+    WindowPlanner(LONG_DOC_WINDOW, LONG_DOC_STRIDE, LONG_DOC_MAX_WINDOWS, LONG_DOC_BUDGET_MS)
+    if LONG_DOC_MODE == "window"
+    else None
+)
+# Window mode needs every token; truncate mode never looks past MAX_SEQ_LEN.
+ANALYSIS_MAX_LEN = None if window_planner is not None else MAX_SEQ_LEN
 
 
 def build_strengths(stats: Dict[str, float | int]) -> List[str]:
@@ -123,133 +266,552 @@ def build_feedback(score: float, stats: Dict[str, float | int]) -> str:
     )
 
 
+def load_model(spec: ModelSpec) -> TorchBackend | OnnxBackend:
+    return load_backend(
+        spec.kind,
+        spec.model_path,
+        spec.onnx_path,
+        precision=spec.precision,
+        intra_op_threads=inference_executor.threads_per_worker,
+    )
+
+
+# Model key -> checkpoint id last swapped in, to tell which checkpoint a reload replaced
+swapped_checkpoints: Dict[str, str] = {}
+
+
+def on_model_swap(key: str, model: TorchBackend | OnnxBackend | None) -> None:
+    global backend
+
+    if key == DEFAULT_MODEL:
+        backend = model
+    live = registry.checkpoint_ids()
+    grade_cache.bind(*live)
+    if model is None:
+        # Evicted or unloaded: its cached results stay valid for when it is loaded again.
+        return
+    checkpoint_id = getattr(model, "checkpoint_id", "")
+    replaced = swapped_checkpoints.get(key)
+    swapped_checkpoints[key] = checkpoint_id
+    if replaced and replaced != checkpoint_id and replaced not in live:
+        # A reload replaced this checkpoint, so results it produced are stale.
+        grade_cache.invalidate(replaced)
+
+
+# Versions are loaded on a background thread and swapped in atomically;
+# requests keep the model they resolved, so a reload never drops one.
+registry = ModelRegistry(
+    load_model,
+    memory_budget_bytes=int(MODEL_MEMORY_BUDGET_MB * (1 << 20)),
+    pinned=(DEFAULT_MODEL,),
+    on_swap=on_model_swap,
+)
+
+
+def register_models() -> None:
+    default_spec = ModelSpec(INFERENCE_BACKEND, MODEL_PATH, ONNX_MODEL_PATH, MODEL_PRECISION)
+    registry.register(DEFAULT_MODEL, default_spec)
+    if MODEL_MANIFEST_PATH:
+        specs, routes = load_manifest(MODEL_MANIFEST_PATH, default_spec)
+        for key, spec in specs.items():
+            registry.register(key, spec)
+        registry.set_routes(routes)
+
+
+def load_near_dup_index() -> NearDupIndex:
+    global near_dup_restore_error
+
+    index = NearDupIndex(
+        num_perm=NEAR_DUP_NUM_PERM,
+        bands=NEAR_DUP_BANDS,
+        shingle_size=NEAR_DUP_SHINGLE_SIZE,
+        threshold=NEAR_DUP_THRESHOLD,
+        max_entries=NEAR_DUP_MAX_ENTRIES,
+    )
+    if NEAR_DUP_SNAPSHOT_PATH and os.path.exists(NEAR_DUP_SNAPSHOT_PATH):
+        try:
+            index.restore(NEAR_DUP_SNAPSHOT_PATH)
+        except (OSError, ValueError, KeyError) as exc:
+            # Start empty; the snapshot is rewritten with the current settings on shutdown.
+            near_dup_restore_error = f"{type(exc).__name__}: {exc}"
+    return index
+
+
+def load_default_models() -> None:
+    global fast_grader, near_dup
+
+    # Per-prompt models load on first use.
+    registry.get(DEFAULT_MODEL)
+    if CASCADE_MODEL_PATH and fast_grader is None:
+        fast_grader = FastGrader.load(CASCADE_MODEL_PATH)
+    if NEAR_DUP_MODE != "off" and near_dup is None:
+        near_dup = load_near_dup_index()
+
+
 def load_artifacts() -> None:
-    global model, vocab
+    register_models()
+    load_default_models()
 
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(
-            f"Model checkpoint not found at '{MODEL_PATH}'. Train the model first or update MODEL_PATH."
-        )
 
-    checkpoint = torch.load(MODEL_PATH, map_location=device)
-    vocab_dict = checkpoint.get("vocab")
-    model_state = checkpoint.get("model_state")
+def warm_up() -> None:
+    """One forward pass off the request path, so the first grade does not fault in weights or kernels."""
+    ids, lengths = pad_ids([analyze_submission(WARMUP_TEXT).ids])
+    backend.predict(ids, lengths)
 
-    if not vocab_dict or not model_state:
-        raise ValueError("Checkpoint is missing 'vocab' or 'model_state' keys.")
 
-    vocab = Vocab()
-    vocab.word2idx = vocab_dict
-    vocab.idx2word = {idx: word for word, idx in vocab_dict.items()}
+def get_model(key: str) -> TorchBackend | OnnxBackend:
+    """Blocking model lookup for worker threads; loads `key` if it is not resident."""
+    try:
+        return registry.get(key)
+    except Exception as exc:
+        raise RuntimeError(f"Failed to load model '{key}': {exc}") from exc
 
-    model = EssayCNNBiLSTM(vocab_size=len(vocab), embed_dim=128, hidden_dim=128, num_layers=1)
-    model.load_state_dict(model_state)
-    model.to(device)
-    model.eval()
 
+async def resolve_model(assignment_id: str | None) -> TorchBackend | OnnxBackend:
+    """Model serving `assignment_id`, awaiting its background load if it is not resident."""
+    key = registry.key_for(assignment_id)
+    model = registry.peek(key)
+    if model is not None:
+        return model
+    try:
+        return await asyncio.wrap_future(registry.load(key))
+    except Exception as exc:
+        raise RuntimeError(f"Failed to load model '{key}': {exc}") from exc
 
-def infer_score(text: str, total_marks: float | None = None) -> float:
-    if model is None or vocab is None:
+
+def configure_inference_threads(num_threads: int) -> None:
+    if backend is not None:
+        backend.configure_threads(num_threads)
+
+
+def get_grade_writer() -> GroupCommitWriter:
+    global grade_writer
+
+    if grade_writer is None:
+        # Opening the store imports records from the legacy JSON file once.
+        grade_writer = GroupCommitWriter(
+            open_grade_store(GRADE_STORE_PATH, GRADE_STORE_LEGACY_PATH),
+            window_ms=GRADE_COMMIT_WINDOW_MS,
+            max_batch=GRADE_COMMIT_MAX_BATCH,
+            sync_policy=GRADE_STORE_SYNC,
+            sync_interval=GRADE_STORE_SYNC_INTERVAL,
+        )
+    return grade_writer
+
+
+def get_job_runner() -> JobRunner:
+    global job_runner
+
+    if job_runner is None:
+        job_runner = JobRunner(
+            JobStore(JOB_STORE_PATH),
+            grade_job_items,
+            batch_size=JOB_BATCH_SIZE,
+            lease_seconds=JOB_LEASE_SECONDS,
+            max_attempts=JOB_MAX_ATTEMPTS,
+            poll_interval=JOB_POLL_INTERVAL,
+        )
+    return job_runner
+
+
+def analyze_submission(text: str, model: TorchBackend | OnnxBackend | None = None) -> AnalyzedText:
+    """Tokenize once into cleaned text, model ids and text stats (with `model`'s vocabulary, default model if None)."""
+    model = model or backend
+    if model is None:
         raise RuntimeError("Model artifacts are not loaded.")
+    return analyze_essay(text, model.vocab, ANALYSIS_MAX_LEN)
 
-    cleaned = clean_essay(text)
-    encoded = vocab.encode(cleaned)
 
-    if len(encoded) < MAX_SEQ_LEN:
-        encoded += [0] * (MAX_SEQ_LEN - len(encoded))
-    else:
-        encoded = encoded[:MAX_SEQ_LEN]
+def predict_padded(ids: np.ndarray, lengths: np.ndarray, model: TorchBackend | OnnxBackend | None = None) -> List[float]:
+    """Score a padded (batch, seq) id array in one forward pass, returning raw 0-60 scores."""
+    model = model or backend
+    if model is None:
+        raise RuntimeError("Model artifacts are not loaded.")
 
-    tensor = torch.tensor([encoded], dtype=torch.long, device=device)
-    with torch.no_grad():
-        pred = model(tensor).item()
+    # Pad only to the longest essay in the batch; the model skips the padding.
+    ids = ids[:, :max(int(lengths.max()), 1)]
+    with model_forward_seconds.time():
+        preds = model.predict(ids, lengths)
+    model_batch_size.observe(len(ids))
 
     # Model outputs scores on 0-60 scale (based on training data)
-    raw_score = max(0.0, min(60.0, float(pred)))
-    
-    # Scale to total_marks if provided, otherwise return raw score
-    if total_marks is not None and total_marks > 0:
-        # Scale from 0-60 to 0-total_marks
-        scaled_score = (raw_score / 60.0) * total_marks
-        
-        # Apply bonus based on raw score (0-60 scale)
-        # If raw score > 50/60, add 10% bonus
-        # If raw score < 50/60, add 20% bonus
-        if raw_score > 50.0:
-            # 10% bonus for scores above 50
-            bonus = scaled_score * 0.10
+    return [max(0.0, min(60.0, float(pred))) for pred in preds]
+
+
+def predict_raw_scores(id_arrays: Sequence[np.ndarray], model: TorchBackend | OnnxBackend | None = None) -> List[float]:
+    return predict_padded(*pad_ids(id_arrays), model=model)
+
+
+def predict_documents(id_arrays: Sequence[np.ndarray], model: TorchBackend | OnnxBackend | None = None) -> List[float]:
+    """
+    Raw 0-60 scores for whole essays. In window mode every window of every
+    essay goes through one forward pass and is folded back into one score
+    per essay; otherwise the (already truncated) ids are scored directly.
+    """
+    if window_planner is None:
+        return predict_raw_scores(id_arrays, model)
+
+    windows, owners, weights = window_planner.split(id_arrays)
+    start = time.perf_counter()
+    raw_scores = predict_raw_scores(windows, model)
+    window_planner.observe(len(windows), time.perf_counter() - start)
+    return aggregate(np.asarray(raw_scores), owners, weights, len(id_arrays)).tolist()
+
+
+def scoring_id(model: TorchBackend | OnnxBackend, cascade: bool = False) -> str:
+    """Identity of what produced a score: the checkpoint plus the long-document and cascade settings."""
+    identity = model.checkpoint_id
+    if window_planner is not None:
+        identity = f"{identity}:window={LONG_DOC_WINDOW}/{LONG_DOC_STRIDE}/{LONG_DOC_MAX_WINDOWS}/{LONG_DOC_BUDGET_MS}"
+    if cascade:
+        identity = f"{identity}:{fast_grader.checkpoint_id}/{cascade_max_std()}/{CASCADE_MARGIN}"
+    return identity
+
+
+def budget_dependent(ids: np.ndarray) -> bool:
+    """
+    True when an essay's deep score depends on the latency budget: its window
+    count follows the measured cost per window, so the score is not cached.
+    """
+    return (
+        window_planner is not None
+        and window_planner.budget_seconds > 0
+        and window_planner.natural_count(len(ids)) > 1
+    )
+
+
+def find_near_dup(assignment_id: str | None, cleaned: str) -> Tuple[np.ndarray | None, NearDupMatch | None]:
+    """Signature of a submission and its closest earlier near-duplicate in the same assignment, if any."""
+    if near_dup is None or not assignment_id:
+        return None, None
+    signature = near_dup.signature(cleaned)
+    if signature is None:
+        return None, None
+    match = near_dup.lookup(assignment_id, signature)
+    if match is not None:
+        grade_near_duplicates.inc("flagged")
+    return signature, match
+
+
+def reuse_near_dup(match: NearDupMatch | None, identity: str, total_marks: float | None) -> float | None:
+    """The near-duplicate's score in reuse mode, if it was graded by the same model on the same scale."""
+    if NEAR_DUP_MODE != "reuse" or match is None:
+        return None
+    score, marks, scored_by, _ = match.payload
+    if scored_by != identity or marks != total_marks:
+        return None
+    grade_near_duplicates.inc("reused")
+    return score
+
+
+def near_dup_id(cleaned: str) -> str:
+    """Opaque id of a submission's text, returned as `near_duplicate_of` instead of who wrote it."""
+    return hashlib.sha256(cleaned.encode("utf-8")).hexdigest()[:16]
+
+
+def remember_near_dup(payload: GradeRequest, signature: np.ndarray | None, match: NearDupMatch | None,
+                      score: float, identity: str, submission_id: str) -> None:
+    """Index a graded submission; a match keeps standing in for it, refreshed if the model changed."""
+    if signature is None:
+        return
+    # No student details: the index is kept in memory and written to snapshots.
+    entry = (score, payload.total_marks, identity, submission_id)
+    if match is None:
+        near_dup.add(payload.assignment_id, signature, entry)
+    elif match.payload[2] != identity:
+        near_dup.update(match, entry)
+
+
+def flag_near_dup(response: GradeResponse, match: NearDupMatch | None, submission_id: str | None) -> GradeResponse:
+    if submission_id is not None:
+        response.metadata["submission_id"] = submission_id
+    if match is not None:
+        response.metadata["near_duplicate_similarity"] = round(match.similarity, 4)
+        response.metadata["near_duplicate_of"] = match.payload[3]
+    return response
+
+
+def uses_cascade(assignment_id: str | None) -> bool:
+    """The fast tier was trained against the default model, so only its assignments are routed."""
+    return fast_grader is not None and registry.key_for(assignment_id) == DEFAULT_MODEL
+
+
+def cascade_max_std() -> float:
+    return CASCADE_MAX_STD if CASCADE_MAX_STD is not None else fast_grader.max_std
+
+
+def fast_tier_scores(cleaned: Sequence[str], total_marks: Sequence[float | None]) -> List[float | None]:
+    """
+    Raw 0-60 fast-tier scores, or None for essays the fast tier is unsure of
+    or that sit near a grade-letter cut-off; those need the deep model.
+    """
+    means, stds = fast_grader.predict(cleaned)
+    max_std = cascade_max_std()
+    results: List[float | None] = []
+    for mean, std, marks in zip(means, stds, total_marks):
+        def letter_for(raw: float, marks: float | None = marks) -> str | None:
+            return grade_letter_for(scale_score(raw, marks), marks)[0]
+
+        if needs_deep(float(mean), float(std), max_std, CASCADE_MARGIN, letter_for):
+            results.append(None)
         else:
-            # 20% bonus for scores below 50
-            bonus = scaled_score * 0.20
-        
-        final_score = scaled_score + bonus
-        
-        # Ensure score doesn't exceed total_marks
-        return max(0.0, min(total_marks, final_score))
-    
-    # If no total_marks provided, apply bonus to raw score
-    if raw_score > 50.0:
-        bonus = raw_score * 0.10
-    else:
-        bonus = raw_score * 0.20
-    
-    final_score = raw_score + bonus
-    return max(0.0, min(60.0, final_score))
+            results.append(max(0.0, min(60.0, float(mean))))
+    routed = sum(score is None for score in results)
+    grade_cascade_routes.inc("deep", amount=routed)
+    grade_cascade_routes.inc("fast", amount=len(results) - routed)
+    return results
 
 
-@app.on_event("startup")
-async def startup_event() -> None:
+def infer_score(text: str, total_marks: float | None = None) -> float:
+    return scale_score(predict_documents([analyze_submission(text).ids])[0], total_marks)
+
+
+def lookup_cached_score(cleaned: str, total_marks: float | None, checkpoint_id: str | None = None) -> Tuple[str, float | None]:
+    """Return the cache key for a cleaned submission and its cached score, if any."""
+    key = grade_cache.key_for(cleaned, total_marks, checkpoint_id)
+    return key, grade_cache.get(key)
+
+
+ScoreItem = Tuple[TorchBackend | OnnxBackend, np.ndarray, float | None]
+
+
+def infer_scores(items: Sequence[ScoreItem]) -> List[float]:
+    """Batched counterpart of `infer_score` for (model, token ids, total_marks) items; one forward pass per model."""
+    groups: Dict[int, List[int]] = {}
+    for index, (model, _, _) in enumerate(items):
+        groups.setdefault(id(model), []).append(index)
+
+    scores = [0.0] * len(items)
+    for indices in groups.values():
+        model = items[indices[0]][0]
+        raw_scores = predict_documents([items[i][1] for i in indices], model)
+        for i, raw in zip(indices, raw_scores):
+            scores[i] = scale_score(raw, items[i][2])
+    return scores
+
+
+# Model forwards run on a dedicated pool so they never block the event loop.
+inference_executor = InferenceExecutor(
+    max_workers=INFERENCE_WORKERS,
+    threads_per_worker=INFERENCE_THREADS,
+    max_queue=INFERENCE_WORKERS,
+    configure_threads=configure_inference_threads,
+)
+
+
+async def score_batch(items: List[ScoreItem]) -> List[float]:
+    return await inference_executor.run(infer_scores, items, wait=True)
+
+
+# Concurrent /api/grade calls are coalesced into a single forward pass.
+batcher = MicroBatcher(
+    score_batch,
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_concurrency=INFERENCE_WORKERS,
+    max_queue=INFERENCE_MAX_QUEUE,
+)
+
+
+async def prepare_model() -> None:
     try:
-        load_artifacts()
-    except Exception as exc:  # pragma: no cover
+        await asyncio.get_running_loop().run_in_executor(None, load_default_models)
+        startup.mark("model_loaded")
+        inference_executor.start()
+        await inference_executor.run(warm_up, wait=True)
+    except Exception as exc:
+        startup.fail(exc)
         raise RuntimeError(f"Failed to load model artifacts: {exc}") from exc
+    startup.mark("ready")
+    # Jobs left unfinished by a previous run resume here.
+    get_job_runner().start()
+
+
+def _retrieve_prepare_error(task: asyncio.Task) -> None:
+    # Already recorded by the tracker and reported through /readyz.
+    if not task.cancelled():
+        task.exception()
+
+
+@app.on_event("startup")
+async def startup_event() -> None:
+    global prepare_task
+
+    register_models()
+    get_grade_writer()
+    get_job_runner()
+    if FAST_START:
+        # Requests arriving meanwhile wait on the same load in the registry.
+        prepare_task = asyncio.get_running_loop().create_task(prepare_model())
+        prepare_task.add_done_callback(_retrieve_prepare_error)
+    else:
+        await prepare_model()
+
+
+@app.on_event("shutdown")
+async def shutdown_event() -> None:
+    if prepare_task is not None and not prepare_task.done():
+        prepare_task.cancel()
+    if job_runner is not None:
+        await job_runner.close()
+    await batcher.close()
+    inference_executor.shutdown()
+    if grade_writer is not None:
+        grade_writer.close()
+    if near_dup is not None and NEAR_DUP_SNAPSHOT_PATH:
+        await asyncio.to_thread(near_dup.save, NEAR_DUP_SNAPSHOT_PATH)
 
 
 @app.get("/healthz")
 async def healthcheck() -> Dict[str, str]:
+    """Liveness: the process is serving, whether or not the model is loaded yet."""
     return {"status": "ok"}
 
 
-@app.post("/api/grade", response_model=GradeResponse)
-async def grade_submission(payload: GradeRequest) -> GradeResponse:
-    if not payload.submission_text.strip():
-        raise HTTPException(status_code=400, detail="Submission text cannot be empty.")
+@app.get("/readyz")
+async def readiness() -> JSONResponse:
+    """Readiness: 200 once the default model is loaded and warmed up, else 503 with the start-up timeline."""
+    return JSONResponse(startup.status(), status_code=200 if startup.ready else 503)
+
+
+@app.get("/metrics")
+async def metrics_endpoint() -> Response:
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+
+def _runtime_gauges():
+    return [
+        *gauges_from_stats("inference_executor", inference_executor.stats(), "Inference executor stat"),
+        *gauges_from_stats("inference_batcher", batcher.stats(), "Micro-batcher stat"),
+        *gauges_from_stats("grade_cache", grade_cache.stats(), "Grade cache stat"),
+        *gauges_from_stats("model_registry", registry_stats(), "Model registry stat"),
+        *gauges_from_stats("startup", startup.seconds(), "Seconds from process start to a start-up milestone"),
+        *gauges_from_stats("near_dup", near_dup.stats() if near_dup else {}, "Near-duplicate index stat"),
+        *gauges_from_stats("grade_jobs", job_stats(), "Grading job stat"),
+        *gauges_from_stats("long_doc", window_planner.stats() if window_planner else {}, "Long-document windowing stat"),
+    ]
+
+
+metrics.add_collector(_runtime_gauges)
+
+
+def near_dup_stats() -> Dict[str, Any]:
+    if near_dup is None:
+        return {"mode": NEAR_DUP_MODE}
+    return {"mode": NEAR_DUP_MODE, **near_dup.stats(), "restore_error": near_dup_restore_error}
 
-    text = payload.submission_text.strip()
-    stats = analyze_text_stats(text)
 
+def job_stats() -> Dict[str, Any]:
+    if job_runner is None:
+        return {}
+    return {**job_runner.stats(), **job_runner.store.stats()}
+
+
+def cascade_stats() -> Dict[str, Any]:
+    if fast_grader is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "checkpoint_id": fast_grader.checkpoint_id,
+        "max_std": cascade_max_std(),
+        "margin": CASCADE_MARGIN,
+        "fast": grade_cascade_routes.value("fast"),
+        "deep": grade_cascade_routes.value("deep"),
+    }
+
+
+def registry_stats() -> Dict[str, float | int]:
+    state = registry.status()
+    return {
+        "loaded": sum(model["state"] == "loaded" for model in state["models"]),
+        "memory_bytes": state["memory_bytes"],
+        "memory_budget_bytes": state["memory_budget_bytes"],
+        "evictions": state["evictions"],
+    }
+
+
+@app.get("/api/inference/stats")
+async def inference_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        "executor": inference_executor.stats(),
+        "batcher": batcher.stats(),
+        "cache": grade_cache.stats(),
+        "models": registry_stats(),
+        "long_doc": window_planner.stats() if window_planner else {"mode": LONG_DOC_MODE},
+        "cascade": cascade_stats(),
+        "jobs": job_stats(),
+        "near_dup": near_dup_stats(),
+    }
+
+
+def require_admin(x_admin_token: str | None = Header(None)) -> None:
+    # The admin API can load arbitrary files from disk, so it is off unless a token is configured.
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled; set ADMIN_TOKEN to enable it.")
+    if not secrets.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+
+@app.get("/api/admin/models", dependencies=[Depends(require_admin)])
+async def list_models() -> Dict[str, Any]:
+    return registry.status()
+
+
+@app.post("/api/admin/models/{key}/reload", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_admin)])
+async def reload_model(key: str, payload: ModelReloadRequest | None = None) -> Dict[str, Any]:
+    """Load a new version of `key` in the background and swap it in once ready; in-flight requests finish on the old one."""
+    payload = payload or ModelReloadRequest()
+    current = registry.spec(key)
+    if current is None and not (payload.model_path or payload.onnx_path):
+        raise HTTPException(status_code=404, detail=f"Unknown model '{key}'. Provide model_path or onnx_path to add it.")
+
+    base = current or registry.spec(DEFAULT_MODEL)
+    spec = base._replace(**{
+        field: value
+        for field, value in (
+            ("kind", payload.backend),
+            ("model_path", payload.model_path),
+            ("onnx_path", payload.onnx_path),
+            ("precision", payload.precision),
+        )
+        if value is not None
+    })
+    future = registry.reload(key, spec)
+    if payload.wait:
+        try:
+            await asyncio.wrap_future(future)
+        except Exception as exc:
+            raise HTTPException(status_code=500, detail=f"Failed to load model '{key}': {exc}") from exc
+
+    return next(model for model in registry.status()["models"] if model["key"] == key)
+
+
+@app.delete("/api/admin/models/{key}", dependencies=[Depends(require_admin)])
+async def unload_model(key: str) -> Dict[str, Any]:
     try:
-        raw_score = infer_score(text, payload.total_marks)
-    except FileNotFoundError as exc:
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
-    except RuntimeError as exc:
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
+        unloaded = registry.unload(key)
+    except ValueError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    if not unloaded:
+        raise HTTPException(status_code=404, detail=f"Model '{key}' is not loaded.")
+    return {"key": key, "state": "unloaded"}
+
+
+@app.post("/api/admin/near-dup/snapshot", dependencies=[Depends(require_admin)])
+async def snapshot_near_dup() -> Dict[str, Any]:
+    """Write the near-duplicate index to NEAR_DUP_SNAPSHOT_PATH now rather than at shutdown."""
+    if near_dup is None or not NEAR_DUP_SNAPSHOT_PATH:
+        raise HTTPException(status_code=409, detail="Near-duplicate snapshots need NEAR_DUP_MODE and NEAR_DUP_SNAPSHOT_PATH.")
+    entries = await asyncio.to_thread(near_dup.save, NEAR_DUP_SNAPSHOT_PATH)
+    return {"path": NEAR_DUP_SNAPSHOT_PATH, "entries": entries}
+
 
+def build_grade_response(payload: GradeRequest, raw_score: float, stats: Dict[str, float | int]) -> GradeResponse:
     normalized_score = round(raw_score, 2)
     strengths = build_strengths(stats)
     improvements = build_improvements(stats)
     feedback = build_feedback(normalized_score, stats)
-
-    # Calculate grade letter and GPA if total_marks is provided
-    grade_letter = None
-    gpa = None
-    if payload.total_marks and payload.total_marks > 0:
-        percentage = (normalized_score / payload.total_marks) * 100
-        if percentage >= 90:
-            grade_letter = "A"
-            gpa = 4.0
-        elif percentage >= 80:
-            grade_letter = "B"
-            gpa = 3.0
-        elif percentage >= 70:
-            grade_letter = "C"
-            gpa = 2.0
-        elif percentage >= 60:
-            grade_letter = "D"
-            gpa = 1.0
-        else:
-            grade_letter = "F"
-            gpa = 0.0
+    grade_letter, gpa = grade_letter_for(normalized_score, payload.total_marks)
 
     metadata: Dict[str, float | int | str] = {
         "student_name": payload.student_name or "",
@@ -269,6 +831,242 @@ async def grade_submission(payload: GradeRequest) -> GradeResponse:
     )
 
 
+@app.post("/api/grade", response_model=GradeResponse)
+async def grade_submission(payload: GradeRequest) -> Response:
+    if not payload.submission_text.strip():
+        raise HTTPException(status_code=400, detail="Submission text cannot be empty.")
+
+    with grade_requests_in_flight.track_inprogress():
+        text = payload.submission_text.strip()
+        try:
+            # The request keeps this model even if a newer version is swapped in meanwhile.
+            model = await resolve_model(payload.assignment_id)
+            with grade_stage_seconds.time("analyze"):
+                analysis = analyze_submission(text, model)
+        except RuntimeError as exc:
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+        cascade = uses_cascade(payload.assignment_id)
+        identity = scoring_id(model, cascade)
+        with grade_stage_seconds.time("cache_lookup"):
+            cache_key, raw_score = lookup_cached_score(analysis.cleaned, payload.total_marks, identity)
+        grade_cache_lookups.inc("miss" if raw_score is None else "hit")
+        signature, match, submission_id = None, None, None
+        if near_dup is not None and payload.assignment_id:
+            submission_id = near_dup_id(analysis.cleaned)
+            with grade_stage_seconds.time("near_dup"):
+                # Tokenizing, hashing and the index lock stay off the event loop.
+                signature, match = await asyncio.to_thread(find_near_dup, payload.assignment_id, analysis.cleaned)
+        if raw_score is None:
+            raw_score = reuse_near_dup(match, identity, payload.total_marks)
+            if raw_score is not None:
+                grade_cache.set(cache_key, raw_score, model.checkpoint_id)
+        if raw_score is None and cascade:
+            with grade_stage_seconds.time("fast_tier"):
+                # TF-IDF transform and scoring are CPU work; keep them off the event loop.
+                fast_scores = await asyncio.to_thread(fast_tier_scores, [analysis.cleaned], [payload.total_marks])
+            fast_score = fast_scores[0]
+            if fast_score is not None:
+                raw_score = scale_score(fast_score, payload.total_marks)
+                grade_cache.set(cache_key, raw_score, model.checkpoint_id)
+        if raw_score is None:
+            try:
+                with grade_stage_seconds.time("inference"):
+                    raw_score = await batcher.submit((model, analysis.ids, payload.total_marks))
+            except QueueFullError as exc:
+                raise HTTPException(status_code=503, detail=str(exc)) from exc
+            except FileNotFoundError as exc:
+                raise HTTPException(status_code=500, detail=str(exc)) from exc
+            except RuntimeError as exc:
+                raise HTTPException(status_code=500, detail=str(exc)) from exc
+            if not budget_dependent(analysis.ids):
+                grade_cache.set(cache_key, raw_score, model.checkpoint_id)
+        if signature is not None:
+            await asyncio.to_thread(remember_near_dup, payload, signature, match, raw_score, identity, submission_id)
+
+        with grade_stage_seconds.time("feedback"):
+            response = flag_near_dup(build_grade_response(payload, raw_score, analysis.stats), match, submission_id)
+        # Serialized here rather than by FastAPI so the stage can be timed.
+        with grade_stage_seconds.time("serialize"):
+            body = response.json()
+        startup.mark("first_grade")
+        return Response(content=body, media_type="application/json")
+
+
+def grade_with_model(model: TorchBackend | OnnxBackend, items: List[GradeRequest],
+                     cascade: bool = False) -> List[GradeResponse]:
+    """
+    Analyze, score and assemble responses for items served by one model; only
+    cache misses reach the model, and with `cascade` only those the fast tier
+    cannot settle.
+    """
+    analyzed = [analyze_submission(item.submission_text.strip(), model) for item in items]
+    identity = scoring_id(model, cascade)
+    cached = [
+        lookup_cached_score(analysis.cleaned, item.total_marks, identity)
+        for analysis, item in zip(analyzed, items)
+    ]
+    scores = [score for _, score in cached]
+    near_dups = [find_near_dup(item.assignment_id, analysis.cleaned) for item, analysis in zip(items, analyzed)]
+    submission_ids = [
+        near_dup_id(analysis.cleaned) if near_dup is not None and item.assignment_id else None
+        for item, analysis in zip(items, analyzed)
+    ]
+    for i, (_, match) in enumerate(near_dups):
+        if scores[i] is None:
+            scores[i] = reuse_near_dup(match, identity, items[i].total_marks)
+            if scores[i] is not None:
+                grade_cache.set(cached[i][0], scores[i], model.checkpoint_id)
+    missing = [i for i, score in enumerate(scores) if score is None]
+
+    if missing and cascade:
+        fast_scores = fast_tier_scores(
+            [analyzed[i].cleaned for i in missing], [items[i].total_marks for i in missing]
+        )
+        for i, raw in zip(missing, fast_scores):
+            if raw is not None:
+                scores[i] = scale_score(raw, items[i].total_marks)
+                grade_cache.set(cached[i][0], scores[i], model.checkpoint_id)
+        missing = [i for i in missing if scores[i] is None]
+
+    if missing:
+        raw_scores = predict_documents([analyzed[i].ids for i in missing], model)
+        for i, raw in zip(missing, raw_scores):
+            scores[i] = scale_score(raw, items[i].total_marks)
+            if not budget_dependent(analyzed[i].ids):
+                grade_cache.set(cached[i][0], scores[i], model.checkpoint_id)
+
+    for item, score, (signature, match), submission_id in zip(items, scores, near_dups, submission_ids):
+        remember_near_dup(item, signature, match, score, identity, submission_id)
+    return [
+        flag_near_dup(build_grade_response(item, score, analysis.stats), match, submission_id)
+        for item, score, analysis, (_, match), submission_id in zip(items, scores, analyzed, near_dups, submission_ids)
+    ]
+
+
+def grade_chunk(items: List[GradeRequest]) -> List[GradeResponse]:
+    """Grade one chunk, with one forward pass per model its assignments resolve to."""
+    if backend is None:
+        raise RuntimeError("Model artifacts are not loaded.")
+
+    groups: Dict[str, List[int]] = {}
+    for index, item in enumerate(items):
+        groups.setdefault(registry.key_for(item.assignment_id), []).append(index)
+
+    responses: List[GradeResponse | None] = [None] * len(items)
+    for key, indices in groups.items():
+        cascade = fast_grader is not None and key == DEFAULT_MODEL
+        graded = grade_with_model(get_model(key), [items[i] for i in indices], cascade)
+        for i, response in zip(indices, graded):
+            responses[i] = response
+    return responses
+
+
+async def grade_chunks(items: List[GradeRequest]) -> AsyncIterator[str]:
+    """Yield one NDJSON line per item, scoring BULK_CHUNK_SIZE essays per forward pass."""
+    for start in range(0, len(items), BULK_CHUNK_SIZE):
+        chunk = items[start:start + BULK_CHUNK_SIZE]
+        try:
+            responses = await inference_executor.run(grade_chunk, chunk, wait=True)
+        except RuntimeError as exc:
+            # Headers are already sent, so failures are reported in-band.
+            for offset in range(len(chunk)):
+                yield json.dumps({"index": start + offset, "error": str(exc)}) + "\n"
+            continue
+
+        for response in responses:
+            yield response.json() + "\n"
+
+
+@app.post("/api/grade/batch")
+async def grade_batch(payload: BatchGradeRequest) -> StreamingResponse:
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one submission.")
+    if len(payload.items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds the limit of {BULK_MAX_ITEMS} submissions.")
+    if any(not item.submission_text.strip() for item in payload.items):
+        raise HTTPException(status_code=400, detail="Submission text cannot be empty.")
+    if backend is None:
+        raise HTTPException(status_code=503, detail="Model artifacts are not loaded.")
+
+    return StreamingResponse(grade_chunks(payload.items), media_type="application/x-ndjson")
+
+
+async def grade_job_items(requests: List[Dict[str, Any]]) -> List[str]:
+    """Grade one batch of a job's essays; the runner stores each response's JSON."""
+    items = [GradeRequest(**request) for request in requests]
+    responses = await inference_executor.run(grade_chunk, items, wait=True)
+    return [response.json() for response in responses]
+
+
+def job_or_404(job: Dict[str, Any] | None, job_id: str) -> Dict[str, Any]:
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'.")
+    return job
+
+
+@app.post("/api/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(payload: BatchGradeRequest) -> Dict[str, Any]:
+    """Queue essays for background grading; poll /api/jobs/{job_id} or stream its /events for progress."""
+    if not payload.items:
+        raise HTTPException(status_code=400, detail="Job must contain at least one submission.")
+    if len(payload.items) > JOB_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Job exceeds the limit of {JOB_MAX_ITEMS} submissions.")
+    if any(not item.submission_text.strip() for item in payload.items):
+        raise HTTPException(status_code=400, detail="Submission text cannot be empty.")
+
+    runner = get_job_runner()
+    job = await asyncio.to_thread(runner.store.create, [item.dict() for item in payload.items])
+    runner.notify()
+    return job
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str) -> Dict[str, Any]:
+    return job_or_404(await asyncio.to_thread(get_job_runner().store.get, job_id), job_id)
+
+
+@app.get("/api/jobs/{job_id}/results")
+async def get_job_results(
+    job_id: str,
+    cursor: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+) -> Dict[str, Any]:
+    """
+    Graded (or failed) essays in the order they finished; pass next_cursor back
+    to page through them, or to poll for more until it comes back null.
+    """
+    store = get_job_runner().store
+    job = job_or_404(await asyncio.to_thread(store.get, job_id), job_id)
+    items, next_cursor = await asyncio.to_thread(store.results, job_id, cursor, limit)
+    return {"job": job, "items": items, "next_cursor": next_cursor}
+
+
+async def job_events(job_id: str, job: Dict[str, Any]) -> AsyncIterator[str]:
+    """Yield the job's status as NDJSON whenever its progress changes, until it finishes."""
+    store = get_job_runner().store
+    while True:
+        yield json.dumps(job) + "\n"
+        if job["status"] in ("completed", "cancelled"):
+            return
+        previous = job
+        while job == previous:
+            await asyncio.sleep(JOB_STREAM_INTERVAL)
+            job = await asyncio.to_thread(store.get, job_id)
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job(job_id: str) -> StreamingResponse:
+    job = job_or_404(await asyncio.to_thread(get_job_runner().store.get, job_id), job_id)
+    return StreamingResponse(job_events(job_id, job), media_type="application/x-ndjson")
+
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str) -> Dict[str, Any]:
+    """Stop grading a job; essays already graded keep their results."""
+    return job_or_404(await asyncio.to_thread(get_job_runner().store.cancel, job_id), job_id)
+
+
 @app.post("/api/grades", response_model=GradeRecordResponse, status_code=status.HTTP_201_CREATED)
 async def save_grade(record: GradeRecordRequest) -> GradeRecordResponse:
     payload = record.dict()
@@ -286,7 +1084,9 @@ async def save_grade(record: GradeRecordRequest) -> GradeRecordResponse:
     }
 
     try:
-        append_grade_record(to_store, GRADE_STORE_PATH)
+        # Resolves once the group commit containing this record is on disk.
+        with grade_store_write_seconds.time():
+            await asyncio.wrap_future(get_grade_writer().submit(to_store))
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to persist grade: {exc}") from exc
 
@@ -299,3 +1099,39 @@ async def save_grade(record: GradeRecordRequest) -> GradeRecordResponse:
         feedback=payload["feedback"],
     )
 
+
+@app.get("/api/grades", response_model=GradeRecordPage)
+async def list_grades(
+    assignment_id: str | None = None,
+    student_name: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = None,
+) -> GradeRecordPage:
+    def query() -> Tuple[List[Dict[str, Any]], str | None]:
+        return open_grade_store(GRADE_STORE_PATH).query(
+            assignment_id=assignment_id,
+            student_name=student_name,
+            limit=limit,
+            cursor=cursor,
+        )
+
+    try:
+        # Off the event loop: a JSONL store scans the whole file on its first query.
+        records, next_cursor = await asyncio.to_thread(query)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    return GradeRecordPage(
+        items=[
+            GradeRecordResponse(
+                record_id=record["record_id"],
+                saved_at=record["saved_at"],
+                student_name=record["student_name"],
+                assignment_id=record["assignment_id"],
+                grade=record["grade"],
+                feedback=record["feedback"],
+            )
+            for record in records
+        ],
+        next_cursor=next_cursor,
+    )
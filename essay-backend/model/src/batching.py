@@ -0,0 +1,144 @@
+import asyncio
+import inspect
+from typing import Any, Callable, Dict, List, Sequence, Set, Tuple
+
+from src.executor import QueueFullError
+
+
+class MicroBatcher:
+    """
+    Collects requests that arrive within a short window and scores them with a
+    single call to `handler`, which receives a list of items and must return
+    (or resolve to) one result per item in the same order.
+
+    A lone request waits at most `max_wait_ms` before being dispatched, so
+    latency stays bounded when traffic is light. At most `max_concurrency`
+    batches are in flight; while they run, new requests keep queueing and are
+    picked up together as the next batch.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[Any]], Any],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_concurrency: int = 1,
+        max_queue: int = 0,
+    ):
+        self.handler = handler
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self._queue: asyncio.Queue | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._worker: asyncio.Task | None = None
+        self._inflight: Set[asyncio.Task] = set()
+        # Items taken off the queue for the batch currently being collected
+        self._collecting: List[Tuple[Any, asyncio.Future]] = []
+        self._batches = 0
+        self._items = 0
+
+    async def submit(self, item: Any) -> Any:
+        """Queue a single item and wait for its result."""
+        self._ensure_started()
+        if self.max_queue and self._queue.qsize() >= self.max_queue:
+            raise QueueFullError("Inference queue is full, retry shortly.")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def close(self) -> None:
+        """Stop the worker, let dispatched batches finish and fail every request still waiting."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+        # Requests that never reached a batch would otherwise hang until their clients time out.
+        pending, self._collecting = self._collecting, []
+        while self._queue is not None and not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(QueueFullError("Inference batcher is shutting down, retry shortly."))
+        self._worker = None
+        self._queue = None
+
+    def stats(self) -> Dict[str, float | int]:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "inflight_batches": len(self._inflight),
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+        }
+
+    def _ensure_started(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = self._collecting = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        self._collecting = []
+        return batch
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        # Callers that gave up (e.g. client disconnect) are not scored.
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+
+        self._batches += 1
+        self._items += len(batch)
+        try:
+            results: Sequence[Any] = self.handler([item for item, _ in batch])
+            if inspect.isawaitable(results):
+                results = await results
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _release(self, task: asyncio.Task) -> None:
+        self._inflight.discard(task)
+        self._slots.release()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._release)
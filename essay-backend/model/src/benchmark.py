@@ -0,0 +1,399 @@
+"""
+Inference benchmark for the grading service.
+
+    python -m src.benchmark                                  # infer + in-process /api/grade
+    python -m src.benchmark --scenarios http                 # spawn uvicorn and drive it over HTTP
+    python -m src.benchmark --scenarios http --url http://127.0.0.1:8000
+    python -m src.benchmark --output bench.json --baseline baseline.json
+
+Scenarios:
+  infer    `infer_score`'s analysis + forward pass on batches of essays (batch size x length)
+  grade    the full `/api/grade` ASGI app in this process (concurrency x length)
+  http     `/api/grade` on a local uvicorn (concurrency x length)
+
+Essays are generated from a fixed seed so runs are comparable, and the grade
+cache is disabled unless `--cache` is given. Results are written as JSON; with
+`--baseline` every matching point is compared and the exit status is 1 if
+throughput drops or p95 latency rises by more than `--tolerance`.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+WORDS = (
+    "the student argues that technology changes how people learn and communicate with each other "
+    "because computers allow access to information from anywhere in the world however some believe "
+    "that spending too much time online reduces physical activity and face to face friendships "
+    "therefore schools should teach balance responsibility patience curiosity evidence reasoning "
+    "community library science history author paragraph conclusion example important different"
+).split()
+
+SCENARIOS = ("infer", "grade", "http")
+
+
+def make_essays(count, length, seed):
+    """`count` distinct essays of `length` words with sentence punctuation."""
+    rng = random.Random(seed)
+    essays = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(length)]
+        for i in range(11, length, 12):
+            words[i] += "."
+        essays.append(" ".join(words).capitalize() + ".")
+    return essays
+
+
+def current_rss_mb(pid="self"):
+    """Resident set size of a process in MB, from /proc (None where unavailable)."""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="ascii") as fp:
+            for line in fp:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def summarize(latencies, items, elapsed, rss_mb, **point):
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        **point,
+        "requests": len(latencies),
+        "items": items,
+        "seconds": round(elapsed, 4),
+        "throughput": round(items / elapsed, 2) if elapsed > 0 else None,
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "rss_mb": round(rss_mb, 1) if rss_mb is not None else None,
+    }
+
+
+def bench_infer(api, batch_sizes, lengths, requests, warmup, seed):
+    results = []
+    for length in lengths:
+        for batch_size in batch_sizes:
+            essays = make_essays((requests + warmup) * batch_size, length, seed)
+            batches = [essays[i:i + batch_size] for i in range(0, len(essays), batch_size)]
+
+            def infer(batch):
+                # Same work as `infer_score`, batched: analysis plus one forward pass
+                return api.predict_documents([api.analyze_submission(text).ids for text in batch])
+
+            for batch in batches[:warmup]:
+                infer(batch)
+
+            latencies = []
+            start = time.perf_counter()
+            for batch in batches[warmup:]:
+                t0 = time.perf_counter()
+                infer(batch)
+                latencies.append(time.perf_counter() - t0)
+            elapsed = time.perf_counter() - start
+            results.append(summarize(
+                latencies, requests * batch_size, elapsed, current_rss_mb(),
+                scenario="infer", batch_size=batch_size, length=length, concurrency=1,
+            ))
+            print(format_point(results[-1]))
+    return results
+
+
+async def _asgi_post(app, path, payload):
+    """Send one JSON POST through the ASGI app; returns (status, body)."""
+    body = json.dumps(payload).encode("utf-8")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode("ascii"),
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii"))],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 80),
+    }
+    sent = False
+    status = None
+    chunks = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+async def _drive(send_one, essays, concurrency):
+    """Send every essay with `concurrency` workers in flight; returns (latencies, elapsed)."""
+    queue = list(reversed(essays))
+    latencies = []
+
+    async def worker():
+        while queue:
+            text = queue.pop()
+            t0 = time.perf_counter()
+            await send_one(text)
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+def _grade_payload(text):
+    return {"submission_text": text, "total_marks": 100}
+
+
+async def bench_grade(api, concurrencies, lengths, requests, warmup, seed):
+    async def send_one(text):
+        status, body = await _asgi_post(api.app, "/api/grade", _grade_payload(text))
+        if status != 200:
+            raise RuntimeError(f"/api/grade returned {status}: {body[:200]!r}")
+
+    await api.startup_event()
+    results = []
+    try:
+        for length in lengths:
+            for concurrency in concurrencies:
+                essays = make_essays(warmup + requests, length, seed + concurrency)
+                await _drive(send_one, essays[:warmup], concurrency)
+                latencies, elapsed = await _drive(send_one, essays[warmup:], concurrency)
+                results.append(summarize(
+                    latencies, requests, elapsed, current_rss_mb(),
+                    scenario="grade", batch_size=1, length=length, concurrency=concurrency,
+                ))
+                print(format_point(results[-1]))
+    finally:
+        await api.shutdown_event()
+    return results
+
+
+def _http_post(url, payload, timeout=60):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+def _wait_for_server(base_url, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/healthz", timeout=2):
+                return
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError(f"Server at {base_url} did not become healthy within {timeout}s")
+
+
+def bench_http(base_url, concurrencies, lengths, requests, warmup, seed, server_pid=None):
+    url = f"{base_url}/api/grade"
+    results = []
+    for length in lengths:
+        for concurrency in concurrencies:
+            essays = make_essays(warmup + requests, length, seed + concurrency)
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                loop = asyncio.new_event_loop()
+
+                async def send_one(text):
+                    await loop.run_in_executor(pool, _http_post, url, _grade_payload(text))
+
+                try:
+                    loop.run_until_complete(_drive(send_one, essays[:warmup], concurrency))
+                    latencies, elapsed = loop.run_until_complete(_drive(send_one, essays[warmup:], concurrency))
+                finally:
+                    loop.close()
+            rss = current_rss_mb(server_pid) if server_pid is not None else None
+            results.append(summarize(
+                latencies, requests, elapsed, rss,
+                scenario="http", batch_size=1, length=length, concurrency=concurrency,
+            ))
+            print(format_point(results[-1]))
+    return results
+
+
+def run_http(args):
+    if args.url:
+        _wait_for_server(args.url.rstrip("/"), None, args.startup_timeout)
+        return bench_http(args.url.rstrip("/"), args.concurrency, args.lengths, args.requests, args.warmup, args.seed)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api:app", "--host", "127.0.0.1", "--port", str(args.port),
+         "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    try:
+        _wait_for_server(base_url, process, args.startup_timeout)
+        return bench_http(
+            base_url, args.concurrency, args.lengths, args.requests, args.warmup, args.seed, server_pid=process.pid
+        )
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def format_point(result):
+    return (
+        f"{result['scenario']:<6} len={result['length']:<4} batch={result['batch_size']:<3} "
+        f"conc={result['concurrency']:<3} {result['throughput']:>9.1f} items/s  "
+        f"p50={result['p50_ms']:.1f}ms p95={result['p95_ms']:.1f}ms p99={result['p99_ms']:.1f}ms"
+        + (f"  rss={result['rss_mb']:.0f}MB" if result["rss_mb"] is not None else "")
+    )
+
+
+def _point_key(result):
+    return result["scenario"], result["batch_size"], result["length"], result["concurrency"]
+
+
+def compare(results, baseline, tolerance):
+    """Compare against a baseline report; returns (rows, regressions)."""
+    previous = {_point_key(result): result for result in baseline.get("results", [])}
+    rows, regressions = [], []
+    for result in results:
+        old = previous.get(_point_key(result))
+        if old is None:
+            continue
+        throughput_change = result["throughput"] / old["throughput"] - 1 if old["throughput"] else 0.0
+        p95_change = result["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+        row = {
+            "scenario": result["scenario"], "batch_size": result["batch_size"],
+            "length": result["length"], "concurrency": result["concurrency"],
+            "throughput_change": round(throughput_change, 4), "p95_change": round(p95_change, 4),
+        }
+        rows.append(row)
+        if throughput_change < -tolerance or p95_change > tolerance:
+            regressions.append(row)
+    return rows, regressions
+
+
+def parse_args(argv=None):
+    def int_list(value):
+        return [int(part) for part in value.split(",") if part]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=lambda v: v.split(","), default=["infer", "grade"],
+                        help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--batch-sizes", type=int_list, default=[1, 8, 32])
+    parser.add_argument("--lengths", type=int_list, default=[50, 150, 300], help="essay lengths in words")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64, help="measured requests per point")
+    parser.add_argument("--warmup", type=int, default=4, help="unmeasured requests per point")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="leave the grade cache enabled")
+    parser.add_argument("--url", help="benchmark an already running server instead of spawning uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="allowed fractional throughput drop / p95 increase before failing")
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.cache:
+        # Distinct essays would mostly miss anyway; this keeps every request on the model path
+        os.environ["GRADE_CACHE_SIZE"] = "0"
+    # The service opens its grade and job stores on start-up; keep benchmark runs out of the real ones.
+    scratch = tempfile.TemporaryDirectory(prefix="grader-bench-")
+    os.environ["GRADE_STORE_PATH"] = os.path.join(scratch.name, "grades.db")
+    os.environ["GRADE_STORE_LEGACY_PATH"] = os.path.join(scratch.name, "grades.json")
+    os.environ["JOB_STORE_PATH"] = os.path.join(scratch.name, "jobs.db")
+    os.environ["NEAR_DUP_SNAPSHOT_PATH"] = ""
+
+    results = []
+    api = None
+    if "infer" in args.scenarios or "grade" in args.scenarios:
+        from src import api
+
+        if "infer" in args.scenarios:
+            api.load_artifacts()
+            api.configure_inference_threads(api.inference_executor.threads_per_worker)
+            results += bench_infer(api, args.batch_sizes, args.lengths, args.requests, args.warmup, args.seed)
+        if "grade" in args.scenarios:
+            results += asyncio.run(
+                bench_grade(api, args.concurrency, args.lengths, args.requests, args.warmup, args.seed)
+            )
+    if "http" in args.scenarios:
+        results += run_http(args)
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "inference_backend": os.getenv("INFERENCE_BACKEND", "torch"),
+            "model_precision": os.getenv("MODEL_PRECISION", "float32"),
+            "checkpoint_id": getattr(getattr(api, "backend", None), "checkpoint_id", None),
+            "cache": args.cache,
+            "seed": args.seed,
+            "requests": args.requests,
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fp:
+            baseline = json.load(fp)
+        rows, regressions = compare(results, baseline, args.tolerance)
+        report["comparison"] = {"baseline": args.baseline, "tolerance": args.tolerance, "points": rows}
+        print(f"\nCompared {len(rows)} points against {args.baseline} (tolerance {args.tolerance:.0%})")
+        for row in rows:
+            flag = "  REGRESSION" if row in regressions else ""
+            print(
+                f"{row['scenario']:<6} len={row['length']:<4} batch={row['batch_size']:<3} conc={row['concurrency']:<3} "
+                f"throughput {row['throughput_change']:+.1%}  p95 {row['p95_change']:+.1%}{flag}"
+            )
+        if regressions:
+            exit_code = 1
+
+    with open(args.output, "w", encoding="utf-8") as fp:
+        json.dump(report, fp, indent=2)
+    print(f"\nResults written to {args.output}")
+    scratch.cleanup()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's contents, used as a checkpoint identity."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_cache_key(cleaned_text: str, total_marks: float | None, checkpoint_id: str) -> str:
+    """Content address for a grading result: cleaned text, marks scale and model."""
+    digest = hashlib.sha256()
+    digest.update(checkpoint_id.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(repr(None if total_marks is None else float(total_marks)).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(cleaned_text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class _DiskCache:
+    """SQLite-backed second tier so several uvicorn workers share hits."""
+
+    _PRUNE_EVERY = 256
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._writes = 0
+        self._local = threading.local()
+        if hasattr(os, "register_at_fork"):
+            # SQLite connections must not be used across fork.
+            os.register_at_fork(after_in_child=self._reset_connections)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS grade_cache ("
+                "key TEXT PRIMARY KEY, checkpoint_id TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _reset_connections(self) -> None:
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, now: float) -> Tuple[Any, float, str] | None:
+        row = self._connect().execute(
+            "SELECT value, expires_at, checkpoint_id FROM grade_cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def set(self, key: str, checkpoint_id: str, value: Any, expires_at: float) -> None:
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO grade_cache (key, checkpoint_id, value, expires_at) VALUES (?, ?, ?, ?)",
+            (key, checkpoint_id, json.dumps(value), expires_at),
+        )
+        self._writes += 1
+        if self._writes % self._PRUNE_EVERY == 0:
+            self.prune(time.time())
+
+    def prune(self, now: float) -> None:
+        conn = self._connect()
+        conn.execute("DELETE FROM grade_cache WHERE expires_at <= ?", (now,))
+        if self.max_entries:
+            conn.execute(
+                "DELETE FROM grade_cache WHERE key IN ("
+                "SELECT key FROM grade_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def invalidate(self, checkpoint_ids: Tuple[str, ...]) -> None:
+        if not checkpoint_ids:
+            return
+        placeholders = ",".join("?" * len(checkpoint_ids))
+        self._connect().execute(f"DELETE FROM grade_cache WHERE checkpoint_id IN ({placeholders})", checkpoint_ids)
+
+
+class GradeCache:
+    """
+    In-process LRU cache with TTL for grading results.
+
+    Entries are bounded by count (`max_entries`) and optionally by an
+    approximate byte size (`max_bytes`). Every entry belongs to the checkpoint
+    that produced it, and several models can share the cache because the
+    checkpoint is part of each key. Entries are only dropped for checkpoints
+    explicitly invalidated, e.g. one replaced by a reload: a model that is
+    merely evicted, or loaded only in another worker, keeps its results. When
+    `disk_path` is set, misses fall through to a shared SQLite file.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 0, ttl_seconds: float = 3600.0, disk_path: str | None = None):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl = float(ttl_seconds)
+        self.checkpoint_ids: Tuple[str, ...] = ()
+
+        # key -> (value, expires_at, approximate size, checkpoint_id)
+        self._entries: "OrderedDict[str, Tuple[Any, float, int, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk = _DiskCache(disk_path, self.max_entries) if disk_path and self.enabled else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @property
+    def checkpoint_id(self) -> str:
+        """The primary (first bound) checkpoint, used when callers do not name one."""
+        return self.checkpoint_ids[0] if self.checkpoint_ids else ""
+
+    def bind(self, *checkpoint_ids: str) -> None:
+        """Record the live checkpoints, primary first; cached results of other checkpoints are kept."""
+        with self._lock:
+            self.checkpoint_ids = tuple(dict.fromkeys(checkpoint_ids))
+
+    def invalidate(self, *checkpoint_ids: str) -> None:
+        """Drop every result produced by `checkpoint_ids`, here and in the shared disk tier."""
+        stale = tuple(dict.fromkeys(checkpoint_id for checkpoint_id in checkpoint_ids if checkpoint_id))
+        if not stale:
+            return
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[3] in stale]:
+                self._remove(key)
+        if self._disk is not None:
+            self._disk.invalidate(stale)
+
+    def key_for(self, cleaned_text: str, total_marks: float | None, checkpoint_id: str | None = None) -> str:
+        return make_cache_key(cleaned_text, total_marks, checkpoint_id or self.checkpoint_id)
+
+    def get(self, key: str) -> Any | None:
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, _, _ = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+
+        if self._disk is not None:
+            found = self._disk.get(key, now)
+            if found is not None:
+                value, expires_at, checkpoint_id = found
+                with self._lock:
+                    self.disk_hits += 1
+                    self._insert(key, value, expires_at, checkpoint_id)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Any, checkpoint_id: str | None = None) -> None:
+        if not self.enabled:
+            return
+
+        checkpoint_id = checkpoint_id or self.checkpoint_id
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._insert(key, value, expires_at, checkpoint_id)
+        if self._disk is not None:
+            self._disk.set(key, checkpoint_id, value, expires_at)
+
+    def stats(self) -> Dict[str, float | int | str]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "enabled": int(self.enabled),
+                "checkpoint_id": self.checkpoint_id,
+                "checkpoints": len(self.checkpoint_ids),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def _insert(self, key: str, value: Any, expires_at: float, checkpoint_id: str) -> None:
+        if key in self._entries:
+            self._remove(key)
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        self._entries[key] = (value, expires_at, size, checkpoint_id)
+        self._bytes += size
+
+        while self._entries and (
+            len(self._entries) > self.max_entries or (self.max_bytes and self._bytes > self.max_bytes)
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
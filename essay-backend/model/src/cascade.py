@@ -0,0 +1,247 @@
+"""
+Two-tier grading cascade with the TF-IDF linear grader as the fast path.
+
+The fast tier is the TF-IDF `Preprocessor` feeding a small bootstrap ensemble
+of `EssayGrader` linear regressions. Their coefficients are stacked into one
+(features, members) matrix, so scoring an essay is one sparse matrix product
+that yields both the ensemble mean (the score) and its spread (the tier's own
+uncertainty). `/api/grade` keeps the fast score unless the spread exceeds
+`max_std` or the score is close enough to a grade-letter cut-off that the
+letter could change; those essays go to EssayCNNBiLSTM.
+
+    python -m src.cascade --checkpoint models/deep_essay_grader.pt --output models/fast_grader.joblib
+    python -m src.cascade --report-only --output models/fast_grader.joblib
+
+Training fits on the train split and calibrates `max_std` on the validation
+split so that `--route-fraction` of essays reach the deep model. The report
+compares routing rates against accuracy, using the deep model's cached
+validation predictions (see src/evaluate.py).
+"""
+import argparse
+import os
+import sys
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+CASCADE_FORMAT_VERSION = 1
+# Routing fractions tabulated by the training report
+REPORT_FRACTIONS = (0.0, 0.1, 0.2, 0.3, 0.5, 0.7, 1.0)
+# Marks scale used to count grade-letter changes in the report
+REPORT_TOTAL_MARKS = 100.0
+
+
+class FastGrader:
+    """Bootstrap ensemble of TF-IDF linear graders; see the module docstring."""
+
+    def __init__(self, vectorizer, coef: np.ndarray, intercept: np.ndarray, max_std: float = float("inf"),
+                 info: Dict | None = None):
+        self.vectorizer = vectorizer
+        self.coef = np.asarray(coef, dtype=np.float32)
+        self.intercept = np.asarray(intercept, dtype=np.float32)
+        self.max_std = float(max_std)
+        self.info = dict(info or {})
+        self.checkpoint_id = ""
+
+    @classmethod
+    def train(cls, texts: Sequence[str], scores: np.ndarray, members: int = 5, max_features: int = 10000,
+              seed: int = 0) -> "FastGrader":
+        from src.model import EssayGrader
+        from src.preprocess import Preprocessor
+
+        preprocessor = Preprocessor(max_features=max_features)
+        features = preprocessor.fit_transform(texts)
+        scores = np.asarray(scores, dtype=np.float64)
+        rng = np.random.default_rng(seed)
+
+        coefs, intercepts = [], []
+        for _ in range(max(2, members)):
+            rows = rng.integers(0, features.shape[0], features.shape[0])
+            grader = EssayGrader()
+            grader.train(features[rows], scores[rows])
+            coefs.append(grader.model.coef_)
+            intercepts.append(grader.model.intercept_)
+        info = {"members": len(coefs), "max_features": max_features, "train_samples": features.shape[0]}
+        return cls(preprocessor.vectorizer, np.stack(coefs, axis=1), np.asarray(intercepts), info=info)
+
+    def predict(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Ensemble mean and standard deviation per essay, on the raw 0-60 scale."""
+        member_preds = np.asarray(self.vectorizer.transform(texts) @ self.coef) + self.intercept
+        return member_preds.mean(axis=1), member_preds.std(axis=1)
+
+    def save(self, path: str) -> None:
+        import joblib
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        payload = {
+            "version": CASCADE_FORMAT_VERSION,
+            "vectorizer": self.vectorizer,
+            "coef": self.coef,
+            "intercept": self.intercept,
+            "max_std": self.max_std,
+            "info": self.info,
+        }
+        tmp_path = f"{path}.tmp"
+        joblib.dump(payload, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FastGrader":
+        import joblib
+
+        from src.cache import file_digest
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Fast grader not found at '{path}'. Train it with `python -m src.cascade`.")
+        payload = joblib.load(path)
+        if payload.get("version") != CASCADE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported fast grader format {payload.get('version')!r} in '{path}'.")
+        grader = cls(payload["vectorizer"], payload["coef"], payload["intercept"], payload["max_std"], payload["info"])
+        grader.checkpoint_id = f"{file_digest(path)}:cascade"
+        return grader
+
+
+def std_threshold(stds: np.ndarray, fraction: float) -> float:
+    """Spread above which `fraction` of essays fall (inf routes none, -1 routes all)."""
+    if fraction <= 0.0:
+        return float("inf")
+    if fraction >= 1.0:
+        return -1.0
+    return float(np.quantile(stds, 1.0 - fraction))
+
+
+def needs_deep(mean: float, std: float, max_std: float, margin: float,
+               letter_for: Callable[[float], str | None]) -> bool:
+    """
+    True when the fast score is not trustworthy: its ensemble spread exceeds
+    `max_std`, or the grade letter would differ within `margin` raw points of it.
+    """
+    if std > max_std:
+        return True
+    letters = {letter_for(min(60.0, max(0.0, raw))) for raw in (mean - margin, mean, mean + margin)}
+    return len(letters) > 1
+
+
+def route_mask(means: np.ndarray, stds: np.ndarray, max_std: float, margin: float,
+               letter_for: Callable[[float], str | None]) -> np.ndarray:
+    return np.fromiter(
+        (needs_deep(float(mean), float(std), max_std, margin, letter_for) for mean, std in zip(means, stds)),
+        dtype=bool,
+        count=len(means),
+    )
+
+
+def routing_report(means: np.ndarray, stds: np.ndarray, deep_preds: np.ndarray, actuals: np.ndarray,
+                   margin: float, fractions: Sequence[float] = REPORT_FRACTIONS) -> List[Dict[str, float]]:
+    """
+    For each target routing fraction (by uncertainty alone), the resulting
+    share of essays sent to the deep model once cut-off proximity is added,
+    and the cascade's accuracy against the deep-only baseline.
+    """
+    from src.evaluate import compute_metrics
+    from src.scoring import grade_letter_for, scale_score
+
+    def letter_for(raw):
+        return grade_letter_for(scale_score(raw, REPORT_TOTAL_MARKS), REPORT_TOTAL_MARKS)[0]
+
+    fast = np.clip(means, 0.0, 60.0)
+    deep = np.clip(deep_preds, 0.0, 60.0)
+    deep_letters = np.array([letter_for(float(raw)) for raw in deep])
+    rows = []
+    for fraction in fractions:
+        max_std = std_threshold(stds, fraction)
+        routed = route_mask(means, stds, max_std, margin, letter_for)
+        combined = np.where(routed, deep, fast)
+        metrics = compute_metrics(combined, actuals)
+        rows.append({
+            "target_fraction": fraction,
+            "max_std": max_std,
+            "routed": float(routed.mean()),
+            "rmse": metrics["rmse"],
+            "mae": metrics["mae"],
+            "qwk": metrics["qwk"],
+            "letter_agreement": float(np.mean([letter_for(float(raw)) for raw in combined] == deep_letters)),
+        })
+    return rows
+
+
+def print_report(rows, fast_metrics, deep_metrics):
+    print("\n" + "=" * 78)
+    print("CASCADE ROUTING REPORT (validation split)")
+    print("=" * 78)
+    print(f"Fast tier only:  RMSE={fast_metrics['rmse']:.4f}  MAE={fast_metrics['mae']:.4f}")
+    print(f"Deep model only: RMSE={deep_metrics['rmse']:.4f}  MAE={deep_metrics['mae']:.4f}")
+    print(f"\n{'Target':>8}{'max_std':>10}{'Routed':>10}{'RMSE':>10}{'MAE':>10}{'QWK':>10}{'Letters=deep':>14}")
+    for row in rows:
+        qwk = "n/a" if row["qwk"] is None else f"{row['qwk']:.4f}"
+        print(f"{row['target_fraction']:>7.0%} {row['max_std']:>10.3f}{row['routed']:>9.1%} {row['rmse']:>10.4f}"
+              f"{row['mae']:>10.4f}{qwk:>10}{row['letter_agreement']:>13.1%}")
+    print("=" * 78)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="data/training_set_rel3.tsv")
+    parser.add_argument("--checkpoint", default="models/deep_essay_grader.pt", help="deep model the cascade falls back to")
+    parser.add_argument("--output", default="models/fast_grader.joblib")
+    parser.add_argument("--members", type=int, default=5, help="bootstrap ensemble size")
+    parser.add_argument("--max-features", type=int, default=10000)
+    parser.add_argument("--route-fraction", type=float, default=0.3,
+                        help="share of validation essays the uncertainty threshold sends to the deep model")
+    parser.add_argument("--margin", type=float, default=float(os.getenv("CASCADE_MARGIN", "1.0")),
+                        help="raw points around grade cut-offs that also go to the deep model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report-only", action="store_true", help="report on an existing --output model")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from src.data_loader import iter_split
+    from src.evaluate import compute_metrics, load_predictions
+
+    args = parse_args(argv)
+
+    def split_arrays(name):
+        texts, scores = [], []
+        for chunk_texts, chunk_scores in iter_split(args.data, name):
+            texts.append(chunk_texts)
+            scores.append(chunk_scores)
+        return np.concatenate(texts), np.concatenate(scores).astype(np.float64)
+
+    if args.report_only:
+        grader = FastGrader.load(args.output)
+    else:
+        print("Training fast tier...")
+        train_texts, train_scores = split_arrays("train")
+        grader = FastGrader.train(train_texts, train_scores, members=args.members,
+                                  max_features=args.max_features, seed=args.seed)
+
+    val_texts, _ = split_arrays("val")
+    means, stds = grader.predict(val_texts)
+    # Row-aligned with iter_split's val order, and cached across runs.
+    deep_preds, actuals, _, _ = load_predictions(args.checkpoint, args.data, split="val")
+
+    rows = routing_report(means, stds, deep_preds, actuals, args.margin)
+    fast_metrics = compute_metrics(np.clip(means, 0.0, 60.0), actuals)
+    deep_metrics = compute_metrics(np.clip(deep_preds, 0.0, 60.0), actuals)
+    print_report(rows, fast_metrics, deep_metrics)
+
+    if not args.report_only:
+        fraction = min(max(args.route_fraction, 0.0), 1.0)
+        grader.max_std = std_threshold(stds, fraction)
+        grader.info.update({
+            "route_fraction": fraction,
+            "margin": args.margin,
+            "val_fast": fast_metrics,
+            "val_deep": deep_metrics,
+            "report": rows,
+        })
+        grader.save(args.output)
+        print(f"\nFast grader saved to {args.output} (max_std={grader.max_std:.3f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,126 @@
+import numpy as np
 import pandas as pd
-import re
 from sklearn.model_selection import train_test_split
 
-def clean_essay(text: str) -> str:
-    """Clean essay text by removing placeholders and special tokens."""
-    if not isinstance(text, str):
-        return ""
-    # Remove placeholders like @CAPS1, @LOCATION1, etc.
-    text = re.sub(r"@\w+", "", text)
-    # Remove multiple spaces
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
-
-def load_dataset(file_path: str, test_size: float = 0.2, random_state: int = 42):
-    """Load dataset and split into train/test sets."""
-    df = pd.read_csv(file_path, sep="\t", encoding="ISO-8859-1")
-    df["essay"] = df["essay"].apply(clean_essay)
-    
-    essays = df["essay"].values
-    scores = df["domain1_score"].values
-    
-    X_train, X_val, y_train, y_val = train_test_split(
-        essays, scores, test_size=test_size, random_state=random_state
+from src.text_analysis import clean_essay  # noqa: F401 - re-exported for existing imports
+
+CHUNK_SIZE = 10_000
+COLUMNS = ("essay_id", "essay", "domain1_score")
+# "hash": per-row assignment used by the streaming loaders (and by checkpoints that record it);
+# "sklearn": the shuffled train_test_split that older checkpoints were trained and validated on
+SPLIT_SCHEMES = ("hash", "sklearn")
+
+
+def clean_essays(essays: pd.Series) -> np.ndarray:
+    """Vectorized `clean_essay` over a column of essays."""
+    # Like clean_essay, anything that is not a string (NaN, a bare number) cleans to "".
+    cleaned = (
+        essays.where(essays.map(lambda essay: isinstance(essay, str)), "").astype(str)
+        .str.replace(r"@\w+", "", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+    return cleaned.to_numpy(dtype=object)
+
+
+def split_fraction(keys: np.ndarray, seed: int) -> np.ndarray:
+    """Map integer row keys to stable pseudo-random fractions in [0, 1) (splitmix64)."""
+    with np.errstate(over="ignore"):
+        z = keys.astype(np.uint64) + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def iter_chunks(file_path: str, chunksize: int = CHUNK_SIZE):
+    """Stream the TSV as (keys, cleaned essays, scores) chunks; keys are essay ids, else row numbers."""
+    reader = pd.read_csv(
+        file_path, sep="\t", encoding="ISO-8859-1", chunksize=chunksize, usecols=lambda col: col in COLUMNS
+    )
+    offset = 0
+    for chunk in reader:
+        if "essay_id" in chunk:
+            keys = chunk["essay_id"].to_numpy(dtype=np.int64)
+        else:
+            keys = np.arange(offset, offset + len(chunk), dtype=np.int64)
+        offset += len(chunk)
+        yield keys, clean_essays(chunk["essay"]), chunk["domain1_score"].to_numpy()
+
+
+def split_mask(keys: np.ndarray, split: str, test_size: float, random_state: int) -> np.ndarray:
+    """Rows of a chunk that belong to the "train" or "val" split."""
+    if split not in ("train", "val"):
+        raise ValueError(f"Unknown split '{split}'. Use 'train' or 'val'.")
+    in_val = split_fraction(keys, random_state) < test_size
+    return in_val if split == "val" else ~in_val
+
+
+def iter_split(file_path: str, split: str, test_size: float = 0.2, random_state: int = 42, chunksize: int = CHUNK_SIZE):
+    """
+    Stream (essays, scores) chunks of the "train" or "val" split. Each row is
+    assigned by hashing its key with `random_state`, so the split is the same
+    however the file is chunked and never needs the whole corpus in memory.
+    """
+    for keys, essays, scores in iter_chunks(file_path, chunksize):
+        mask = split_mask(keys, split, test_size, random_state)
+        if mask.any():
+            yield essays[mask], scores[mask]
+
+
+def split_column(file_path: str, split: str, column: str, test_size: float = 0.2, random_state: int = 42,
+                 chunksize: int = CHUNK_SIZE) -> np.ndarray | None:
+    """
+    One column (e.g. "essay_set") of a split, row-aligned with `iter_split`,
+    without parsing the essay text; None if the file has no such column.
+    """
+    wanted = ("essay_id", column)
+    reader = pd.read_csv(
+        file_path, sep="\t", encoding="ISO-8859-1", chunksize=chunksize, usecols=lambda col: col in wanted
     )
+    parts, offset = [], 0
+    for chunk in reader:
+        if column not in chunk:
+            return None
+        if "essay_id" in chunk:
+            keys = chunk["essay_id"].to_numpy(dtype=np.int64)
+        else:
+            keys = np.arange(offset, offset + len(chunk), dtype=np.int64)
+        offset += len(chunk)
+        parts.append(chunk[column].to_numpy()[split_mask(keys, split, test_size, random_state)])
+    return np.concatenate(parts) if parts else np.empty(0)
+
+
+def iter_split_texts(file_path: str, split: str, **kwargs):
+    """Essay chunks only, e.g. for `Vocab.build_vocab_parallel`."""
+    for essays, _ in iter_split(file_path, split, **kwargs):
+        yield essays
+
+
+def load_dataset(file_path: str, test_size: float = 0.2, random_state: int = 42, split: str = "sklearn"):
+    """
+    Load dataset and split into train/test sets. `split` picks the scheme (see
+    SPLIT_SCHEMES); the "sklearn" default reproduces the validation set of
+    checkpoints that do not record one.
+    """
+    if split not in SPLIT_SCHEMES:
+        raise ValueError(f"Unknown split scheme '{split}'. Use one of {SPLIT_SCHEMES}.")
+    if split == "sklearn":
+        chunks = list(iter_chunks(file_path))
+        essays = np.concatenate([chunk[1] for chunk in chunks]) if chunks else np.empty(0, dtype=object)
+        scores = np.concatenate([chunk[2] for chunk in chunks]) if chunks else np.empty(0, dtype=np.int64)
+        return train_test_split(essays, scores, test_size=test_size, random_state=random_state)
+
+    parts = {"train": ([], []), "val": ([], [])}
+    for keys, essays, scores in iter_chunks(file_path):
+        in_val = split_fraction(keys, random_state) < test_size
+        for split, mask in (("train", ~in_val), ("val", in_val)):
+            parts[split][0].append(essays[mask])
+            parts[split][1].append(scores[mask])
+
+    def join(arrays, dtype):
+        return np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+
+    X_train, y_train = join(parts["train"][0], object), join(parts["train"][1], np.int64)
+    X_val, y_val = join(parts["val"][0], object), join(parts["val"][1], np.int64)
     return X_train, X_val, y_train, y_val
@@ -1,38 +1,13 @@
+import os
+import random
+from pathlib import Path
+
+import numpy as np
 import torch
-from torch.utils.data import Dataset
-from collections import Counter
-import re
-
-def simple_tokenizer(text):
-    """Very basic tokenizer: lowercase + split by non-alphabetic."""
-    text = text.lower()
-    tokens = re.findall(r"[a-zA-Z']+", text)
-    return tokens
-
-class Vocab:
-    def __init__(self, min_freq=2):
-        self.word2idx = {"<PAD>": 0, "<UNK>": 1}
-        self.idx2word = {0: "<PAD>", 1: "<UNK>"}
-        self.min_freq = min_freq
-
-    def build_vocab(self, texts):
-        counter = Counter()
-        for text in texts:
-            tokens = simple_tokenizer(text)
-            counter.update(tokens)
-
-        for word, freq in counter.items():
-            if freq >= self.min_freq and word not in self.word2idx:
-                idx = len(self.word2idx)
-                self.word2idx[word] = idx
-                self.idx2word[idx] = word
-
-    def encode(self, text):
-        tokens = simple_tokenizer(text)
-        return [self.word2idx.get(tok, self.word2idx["<UNK>"]) for tok in tokens]
+from torch.utils.data import Dataset, Sampler
+
+from src.vocab import Vocab, simple_tokenizer  # noqa: F401 - re-exported for existing imports
 
-    def __len__(self):
-        return len(self.word2idx)
 
 class EssayDataset(Dataset):
     def __init__(self, texts, scores, vocab, max_len=300):
@@ -48,11 +23,130 @@ class EssayDataset(Dataset):
         text = self.texts[idx]
         score = float(self.scores[idx])
 
-        # Encode and pad
-        encoded = self.vocab.encode(text)
-        if len(encoded) < self.max_len:
-            encoded += [0] * (self.max_len - len(encoded))
-        else:
-            encoded = encoded[:self.max_len]
+        # Encode and truncate; padding is done per batch by collate_essays
+        encoded = self.vocab.encode(text)[:self.max_len]
 
         return torch.tensor(encoded, dtype=torch.long), torch.tensor(score, dtype=torch.float)
+
+    def lengths(self):
+        """Token count of every essay after truncation, used for length bucketing."""
+        return [min(len(simple_tokenizer(text)), self.max_len) for text in self.texts]
+
+
+class MemmapEssayDataset(Dataset):
+    """
+    Zero-copy view of a split written by src.token_cache. Arrays are mapped
+    lazily and dropped when pickled, so each DataLoader worker maps the same
+    read-only files rather than receiving a copy.
+    """
+    def __init__(self, prefix):
+        self.prefix = Path(prefix)
+        self._arrays = None
+        self._offsets = np.fromfile(f"{self.prefix}.offsets.bin", dtype="<i8")
+
+    @staticmethod
+    def _map(path, dtype):
+        # np.memmap rejects empty files
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+
+    def _load(self):
+        if self._arrays is None:
+            self._arrays = (
+                self._map(f"{self.prefix}.ids.bin", "<i4"),
+                self._map(f"{self.prefix}.scores.bin", "<f4"),
+            )
+        return self._arrays
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        return state
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx):
+        ids, scores = self._load()
+        start, end = self._offsets[idx], self._offsets[idx + 1]
+        return torch.from_numpy(ids[start:end].astype(np.int64)), torch.tensor(float(scores[idx]), dtype=torch.float)
+
+    def lengths(self):
+        return np.diff(self._offsets).tolist()
+
+
+def pad_sequences(sequences, pad_value=0):
+    """Pad id sequences to the longest one in the batch; returns (padded, lengths)."""
+    lengths = torch.tensor([len(seq) for seq in sequences], dtype=torch.long)
+    width = max(int(lengths.max()) if len(sequences) else 0, 1)
+    padded = torch.full((len(sequences), width), pad_value, dtype=torch.long)
+    for row, seq in enumerate(sequences):
+        if len(seq):
+            padded[row, :len(seq)] = torch.as_tensor(seq, dtype=torch.long)
+    return padded, lengths
+
+
+def collate_essays(batch):
+    """DataLoader collate_fn with dynamic padding: yields (essays, lengths, scores)."""
+    sequences, scores = zip(*batch)
+    essays, lengths = pad_sequences(sequences)
+    return essays, lengths, torch.stack(scores)
+
+
+class LengthBucketSampler(Sampler):
+    """
+    Batch sampler that groups essays of similar length so dynamic padding stays
+    small. Indices are shuffled, split into pools of `batch_size * pool_factor`,
+    sorted by length within each pool and cut into batches; batch order is
+    shuffled again so training still sees lengths in random order.
+
+    For distributed training every rank builds the same batch list (same seed
+    and epoch) and takes every `num_replicas`-th batch starting at `rank`. The
+    list is padded by repeating leading batches so all ranks run the same
+    number of steps.
+    """
+    def __init__(self, lengths, batch_size, shuffle=True, pool_factor=50, seed=0, num_replicas=1, rank=0):
+        if not 0 <= rank < num_replicas:
+            raise ValueError(f"rank {rank} is outside [0, {num_replicas})")
+        self.lengths = list(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.pool_size = batch_size * pool_factor
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _batches(self):
+        indices = list(range(len(self.lengths)))
+        if not self.shuffle:
+            indices.sort(key=self.lengths.__getitem__)
+            return [indices[i:i + self.batch_size] for i in range(0, len(indices), self.batch_size)]
+
+        rng = random.Random(self.seed + self.epoch)
+        rng.shuffle(indices)
+        batches = []
+        for start in range(0, len(indices), self.pool_size):
+            pool = sorted(indices[start:start + self.pool_size], key=self.lengths.__getitem__)
+            batches.extend(pool[i:i + self.batch_size] for i in range(0, len(pool), self.batch_size))
+        rng.shuffle(batches)
+        return batches
+
+    def _num_batches(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        batches = self._batches()
+        self.epoch += 1
+        if self.num_replicas > 1 and batches:
+            total = len(self) * self.num_replicas
+            batches = (batches * (total // len(batches) + 1))[:total]
+            batches = batches[self.rank::self.num_replicas]
+        return iter(batches)
+
+    def __len__(self):
+        return (self._num_batches() + self.num_replicas - 1) // self.num_replicas
@@ -1,6 +1,7 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 
 class AttentionPooling(nn.Module):
     """Attention mechanism for better pooling."""
@@ -8,9 +9,11 @@ class AttentionPooling(nn.Module):
         super(AttentionPooling, self).__init__()
         self.attention = nn.Linear(hidden_dim, 1)
         
-    def forward(self, lstm_out):
-        # lstm_out: (batch, seq_len, hidden_dim)
+    def forward(self, lstm_out, mask=None):
+        # lstm_out: (batch, seq_len, hidden_dim), mask: (batch, seq_len) True for real tokens
         attention_weights = self.attention(lstm_out)  # (batch, seq_len, 1)
+        if mask is not None:
+            attention_weights = attention_weights.masked_fill(~mask.unsqueeze(-1), float("-inf"))
         attention_weights = F.softmax(attention_weights, dim=1)
         pooled = torch.sum(attention_weights * lstm_out, dim=1)  # (batch, hidden_dim)
         return pooled
@@ -41,25 +44,37 @@ class EssayCNNBiLSTM(nn.Module):
         self.fc2 = nn.Linear(64, 1)
         self.dropout = nn.Dropout(dropout)
         
-    def forward(self, x):
+    def forward(self, x, lengths=None):
+        # lengths: optional (batch,) token counts; when given, padding is
+        # skipped by the BiLSTM and ignored by attention pooling.
+        mask = None
+        if lengths is not None:
+            lengths = lengths.to(x.device).clamp(min=1)
+            mask = torch.arange(x.size(1), device=x.device).unsqueeze(0) < lengths.unsqueeze(1)
+
         # Embedding
         embedded = self.embedding(x)  # (batch, seq_len, embed_dim)
         
         # CNN feature extraction (transpose for conv1d: batch, channels, seq_len)
         x_conv = embedded.transpose(1, 2)
-        x_conv = F.relu(self.bn1(self.conv1(x_conv)))
-        x_conv = F.relu(self.bn2(self.conv2(x_conv)))
-        x_conv = self.bn3(self.conv3(x_conv))
+        x_conv = self._mask_padding(F.relu(self.bn1(self.conv1(x_conv))), mask)
+        x_conv = self._mask_padding(F.relu(self.bn2(self.conv2(x_conv))), mask)
+        x_conv = self._mask_padding(self.bn3(self.conv3(x_conv)), mask)
         x_conv = x_conv.transpose(1, 2)  # Back to (batch, seq_len, embed_dim)
         
         # Residual connection
         x_conv = x_conv + embedded
         
         # LSTM
-        lstm_out, _ = self.lstm(x_conv)
+        if lengths is not None:
+            packed = pack_padded_sequence(x_conv, lengths.cpu(), batch_first=True, enforce_sorted=False)
+            packed_out, _ = self.lstm(packed)
+            lstm_out, _ = pad_packed_sequence(packed_out, batch_first=True, total_length=x.size(1))
+        else:
+            lstm_out, _ = self.lstm(x_conv)
         
         # Attention pooling
-        pooled = self.attention(lstm_out)
+        pooled = self.attention(lstm_out, mask)
         pooled = self.dropout(pooled)
         
         # Final prediction
@@ -68,3 +83,11 @@ class EssayCNNBiLSTM(nn.Module):
         output = self.fc2(out)
         
         return output.squeeze()
+
+    @staticmethod
+    def _mask_padding(x_conv, mask):
+        # Zero padded positions so the next convolution sees the same
+        # boundary regardless of how much padding the batch carries.
+        if mask is None:
+            return x_conv
+        return x_conv * mask.unsqueeze(1).to(x_conv.dtype)
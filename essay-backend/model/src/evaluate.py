@@ -1,79 +1,289 @@
-import torch
-import torch.nn as nn
-from torch.utils.data import DataLoader
+"""
+Evaluate checkpoints on the validation split.
+
+    python -m src.evaluate                                    # models/deep_essay_grader.pt
+    python -m src.evaluate models/a.pt models/b.pt --output eval_report.json
+    python -m src.evaluate models/a.pt --precision int8 models/a.onnx
+
+Predictions are cached under EVAL_CACHE_DIR, keyed by the checkpoint's and the
+dataset's content hashes (plus split and precision), so reruns and metric
+changes skip the model entirely and comparing several checkpoints costs one
+forward pass over the split per checkpoint, ever. Metrics (RMSE, MAE,
+within-N accuracy and quadratic weighted kappa) are computed overall and per
+`essay_set` on preallocated NumPy arrays.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
 import numpy as np
+import torch
+
+from src.cache import file_digest
+from src.data_loader import iter_split, split_column
+from src.token_cache import load_or_build
+
+TOKEN_CACHE_DIR = os.getenv("TOKEN_CACHE_DIR", "data/token_cache")
+EVAL_CACHE_DIR = os.getenv("EVAL_CACHE_DIR", "data/eval_cache")
+PREDICTION_CACHE_VERSION = 1
+WITHIN_POINTS = (5, 10, 15)
+MAX_LEN = 300
+
+
+def quadratic_weighted_kappa(actuals, preds):
+    """
+    Quadratic weighted kappa between rounded predictions and actual scores on
+    the actual scores' range; None when it is undefined (a single score level).
+    """
+    actuals = np.rint(actuals).astype(np.int64)
+    if len(actuals) == 0:
+        return None
+    low, high = int(actuals.min()), int(actuals.max())
+    levels = high - low + 1
+    if levels < 2:
+        return None
+    preds = np.clip(np.rint(preds).astype(np.int64), low, high)
+
+    observed = np.bincount((actuals - low) * levels + (preds - low), minlength=levels * levels)
+    observed = observed.reshape(levels, levels).astype(np.float64)
+    expected = np.outer(observed.sum(axis=1), observed.sum(axis=0)) / observed.sum()
+    grid = np.arange(levels)
+    weights = (grid[:, None] - grid[None, :]) ** 2 / (levels - 1) ** 2
+    denominator = (weights * expected).sum()
+    return float(1.0 - (weights * observed).sum() / denominator) if denominator else None
+
+
+def compute_metrics(preds, actuals):
+    errors = np.abs(preds - actuals)
+    metrics = {
+        "count": int(len(errors)),
+        "rmse": float(np.sqrt(np.mean(errors ** 2))),
+        "mae": float(np.mean(errors)),
+    }
+    for points in WITHIN_POINTS:
+        metrics[f"within_{points}"] = float(np.mean(errors <= points) * 100)
+    metrics["qwk"] = quadratic_weighted_kappa(actuals, preds)
+    return metrics
+
+
+def per_set_metrics(preds, actuals, essay_sets):
+    """`compute_metrics` for every essay set, with the sums done in one bincount per metric."""
+    labels, inverse = np.unique(essay_sets, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(labels))
+    errors = np.abs(preds - actuals)
+    columns = {
+        "rmse": np.sqrt(np.bincount(inverse, weights=errors ** 2, minlength=len(labels)) / counts),
+        "mae": np.bincount(inverse, weights=errors, minlength=len(labels)) / counts,
+    }
+    for points in WITHIN_POINTS:
+        columns[f"within_{points}"] = np.bincount(inverse, weights=errors <= points, minlength=len(labels)) / counts * 100
+
+    # Kappa is set-specific (each prompt has its own score range), so it is taken per set.
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    results = {}
+    for index, label in enumerate(labels):
+        rows = order[bounds[index]:bounds[index + 1]]
+        results[str(label)] = {
+            "count": int(counts[index]),
+            **{name: float(values[index]) for name, values in columns.items()},
+            "qwk": quadratic_weighted_kappa(actuals[rows], preds[rows]),
+        }
+    return results
 
-from src.data_loader import load_dataset
-from src.dataset import Vocab, EssayDataset
-from src.deep_model import EssayCNNBiLSTM
 
 def evaluate_model(model, data_loader, device):
+    """Score a loader of (essays, lengths, scores) batches with a torch model."""
     model.eval()
-    preds, actuals = [], []
+    capacity = len(data_loader.dataset)
+    preds = np.empty(capacity, dtype=np.float32)
+    actuals = np.empty(capacity, dtype=np.float32)
+    filled = 0
     with torch.no_grad():
-        for essays, scores in data_loader:
-            essays, scores = essays.to(device), scores.to(device)
-            outputs = model(essays)
-            preds.extend(outputs.cpu().numpy())
-            actuals.extend(scores.cpu().numpy())
-    preds = np.array(preds)
-    actuals = np.array(actuals)
-    rmse = np.sqrt(np.mean((preds - actuals) ** 2))
-    mae = np.mean(np.abs(preds - actuals))
-    
-    # Calculate accuracy metrics (percentage within threshold)
-    errors = np.abs(preds - actuals)
-    accuracy_5 = np.mean(errors <= 5) * 100  # Within 5 points
-    accuracy_10 = np.mean(errors <= 10) * 100  # Within 10 points
-    accuracy_15 = np.mean(errors <= 15) * 100  # Within 15 points
-    
-    return rmse, mae, accuracy_5, accuracy_10, accuracy_15, preds, actuals
-
-def main():
-    data_path = "data/training_set_rel3.tsv"
-    model_path = "models/deep_essay_grader.pt"
-
-    # Load validation data
-    _, X_val, _, y_val = load_dataset(data_path)
-
-    # Load checkpoint
-    checkpoint = torch.load(model_path, map_location=torch.device("cpu"))
-    vocab_dict = checkpoint["vocab"]
-
-    # Rebuild vocab
-    vocab = Vocab()
-    vocab.word2idx = vocab_dict
-    vocab.idx2word = {idx: word for word, idx in vocab_dict.items()}
-
-    # Create validation dataset
-    val_dataset = EssayDataset(X_val, y_val, vocab, max_len=300)
-    val_loader = DataLoader(val_dataset, batch_size=32)
-
-    # Rebuild model
-    model = EssayCNNBiLSTM(vocab_size=len(vocab), embed_dim=128, hidden_dim=128, num_layers=1)
-    model.load_state_dict(checkpoint["model_state"])
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model.to(device)
-
-    # Evaluate
-    rmse, mae, acc_5, acc_10, acc_15, preds, actuals = evaluate_model(model, val_loader, device)
-    
-    print("\n" + "="*60)
+        for essays, lengths, scores in data_loader:
+            count = len(scores)
+            if filled + count > capacity:
+                # Samplers that repeat rows (e.g. distributed padding) can exceed the dataset size.
+                capacity = max(capacity * 2, filled + count)
+                preds, actuals = np.resize(preds, capacity), np.resize(actuals, capacity)
+            outputs = model(essays.to(device), lengths).reshape(-1)
+            preds[filled:filled + count] = outputs.cpu().numpy()
+            actuals[filled:filled + count] = scores.numpy()
+            filled += count
+    preds, actuals = preds[:filled], actuals[:filled]
+
+    metrics = compute_metrics(preds, actuals)
+    within = [metrics[f"within_{points}"] for points in WITHIN_POINTS]
+    return (metrics["rmse"], metrics["mae"], *within, preds, actuals)
+
+
+def predict_dataset(backend, dataset, batch_size=64):
+    """Raw predictions and targets for every row of a `MemmapEssayDataset`, in row order."""
+    from torch.utils.data import DataLoader
+
+    from src.dataset import LengthBucketSampler, collate_essays
+
+    # Length-sorted batches keep padding small; results are scattered back by row index.
+    batches = list(LengthBucketSampler(dataset.lengths(), batch_size, shuffle=False))
+    loader = DataLoader(dataset, batch_sampler=batches, collate_fn=collate_essays)
+    preds = np.empty(len(dataset), dtype=np.float32)
+    actuals = np.empty(len(dataset), dtype=np.float32)
+    for rows, (essays, lengths, scores) in zip(batches, loader):
+        preds[rows] = backend.predict(essays.numpy(), lengths.numpy())
+        actuals[rows] = scores.numpy()
+    return preds, actuals
+
+
+def checkpoint_kind(path):
+    return "onnx" if str(path).endswith(".onnx") else "torch"
+
+
+def prediction_cache_path(cache_dir, checkpoint_path, precision, data_digest, split, test_size, random_state):
+    kind = checkpoint_kind(checkpoint_path)
+    # Same identity the serving backends report as `checkpoint_id`.
+    checkpoint_id = f"{file_digest(checkpoint_path)}:{'onnx' if kind == 'onnx' else precision}"
+    digest = hashlib.sha256()
+    for part in (PREDICTION_CACHE_VERSION, checkpoint_id, data_digest, split, test_size, random_state, MAX_LEN):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return Path(cache_dir) / f"{digest.hexdigest()[:32]}.npz", checkpoint_id
+
+
+def load_predictions(checkpoint_path, data_path, split="val", precision="float32", test_size=0.2, random_state=42,
+                     cache_dir=EVAL_CACHE_DIR, use_cache=True, data_digest=None):
+    """
+    Return (preds, actuals, essay_sets, cached) for a checkpoint on a split.
+    `essay_sets` is empty when the TSV has no essay_set column.
+    """
+    from src.inference import load_backend
+
+    data_digest = data_digest or file_digest(data_path)
+    cache_path, checkpoint_id = prediction_cache_path(
+        cache_dir, checkpoint_path, precision, data_digest, split, test_size, random_state
+    )
+    if use_cache and cache_path.exists():
+        with np.load(cache_path) as cached:
+            return cached["preds"], cached["actuals"], cached["essay_sets"], True
+
+    kind = checkpoint_kind(checkpoint_path)
+    backend = load_backend(kind, checkpoint_path, checkpoint_path, precision=precision)
+
+    def load_splits():
+        return {
+            name: iter_split(data_path, name, test_size=test_size, random_state=random_state)
+            for name in ("train", "val")
+        }
+
+    # The TSV is only parsed on a token-cache miss.
+    dataset = load_or_build(
+        TOKEN_CACHE_DIR, data_path, backend.vocab, max_len=MAX_LEN, load_splits=load_splits,
+        test_size=test_size, random_state=random_state,
+    )[split]
+    preds, actuals = predict_dataset(backend, dataset)
+    essay_sets = split_column(data_path, split, "essay_set", test_size=test_size, random_state=random_state)
+    if essay_sets is None:
+        essay_sets = np.empty(0, dtype=np.int64)
+    elif len(essay_sets) != len(preds):
+        raise ValueError(f"essay_set column has {len(essay_sets)} rows but the '{split}' split has {len(preds)}.")
+
+    if use_cache:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as fp:
+            np.savez(fp, preds=preds, actuals=actuals, essay_sets=essay_sets, checkpoint_id=checkpoint_id)
+        os.replace(tmp_path, cache_path)
+    return preds, actuals, essay_sets, False
+
+
+def _format(value, spec):
+    return "n/a" if value is None else format(value, spec)
+
+
+def print_report(results, samples):
+    print("\n" + "=" * 78)
     print("MODEL EVALUATION RESULTS")
-    print("="*60)
-    print(f"RMSE (Root Mean Squared Error): {rmse:.4f}")
-    print(f"MAE (Mean Absolute Error): {mae:.4f}")
-    print(f"\nAccuracy Metrics:")
-    print(f"  Within 5 points:  {acc_5:.2f}%")
-    print(f"  Within 10 points: {acc_10:.2f}%")
-    print(f"  Within 15 points: {acc_15:.2f}%")
-    print("="*60)
-    
-    # Show some sample predictions
-    print("\nSample Predictions (first 10):")
-    for i in range(min(10, len(preds))):
-        error = abs(preds[i] - actuals[i])
-        print(f"Essay {i+1}: Predicted={preds[i]:.2f}, Actual={actuals[i]:.2f}, Error={error:.2f}")
+    print("=" * 78)
+    header = f"{'Checkpoint':<30}{'RMSE':>8}{'MAE':>8}" + "".join(f"{f'<={p}':>8}" for p in WITHIN_POINTS) + f"{'QWK':>8}"
+    print(header)
+    for result in results:
+        overall = result["overall"]
+        name = Path(result["checkpoint"]).name + (" (cached)" if result["cached"] else "")
+        within = "".join(f"{overall[f'within_{p}']:>7.2f}%" for p in WITHIN_POINTS)
+        print(f"{name:<30}{overall['rmse']:>8.4f}{overall['mae']:>8.4f}{within}{_format(overall['qwk'], '>8.4f')}")
+
+    for result in results:
+        if not result["per_set"]:
+            continue
+        print(f"\nPer essay set: {result['checkpoint']}")
+        print(f"{'Set':<8}{'Count':>8}{'RMSE':>8}{'MAE':>8}" + "".join(f"{f'<={p}':>8}" for p in WITHIN_POINTS) + f"{'QWK':>8}")
+        for label, metrics in result["per_set"].items():
+            within = "".join(f"{metrics[f'within_{p}']:>7.2f}%" for p in WITHIN_POINTS)
+            print(f"{label:<8}{metrics['count']:>8}{metrics['rmse']:>8.4f}{metrics['mae']:>8.4f}{within}"
+                  f"{_format(metrics['qwk'], '>8.4f')}")
+    print("=" * 78)
+
+    if samples and results:
+        preds, actuals = results[0]["preds"], results[0]["actuals"]
+        print(f"\nSample Predictions (first {min(samples, len(preds))}):")
+        for i in range(min(samples, len(preds))):
+            error = abs(preds[i] - actuals[i])
+            print(f"Essay {i+1}: Predicted={preds[i]:.2f}, Actual={actuals[i]:.2f}, Error={error:.2f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("checkpoints", nargs="*", default=["models/deep_essay_grader.pt"],
+                        help=".pt checkpoints or exported .onnx graphs")
+    parser.add_argument("--data", default="data/training_set_rel3.tsv")
+    parser.add_argument("--split", choices=("train", "val"), default="val")
+    parser.add_argument("--precision", choices=("float32", "int8"), default="float32", help="for .pt checkpoints")
+    parser.add_argument("--cache-dir", default=EVAL_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="always run the model and do not store predictions")
+    parser.add_argument("--samples", type=int, default=10, help="sample predictions to print for the first checkpoint")
+    parser.add_argument("--output", help="write the metrics as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data_digest = file_digest(args.data)
+
+    results = []
+    for checkpoint in args.checkpoints:
+        preds, actuals, essay_sets, cached = load_predictions(
+            checkpoint, args.data, split=args.split, precision=args.precision,
+            cache_dir=args.cache_dir, use_cache=not args.no_cache, data_digest=data_digest,
+        )
+        results.append({
+            "checkpoint": checkpoint,
+            "precision": "float32" if checkpoint_kind(checkpoint) == "onnx" else args.precision,
+            "cached": cached,
+            "overall": compute_metrics(preds, actuals),
+            "per_set": per_set_metrics(preds, actuals, essay_sets) if len(essay_sets) else {},
+            "preds": preds,
+            "actuals": actuals,
+        })
+
+    print_report(results, args.samples)
+
+    if args.output:
+        report = {
+            "data": args.data,
+            "data_digest": data_digest,
+            "split": args.split,
+            "checkpoints": [
+                {key: value for key, value in result.items() if key not in ("preds", "actuals")}
+                for result in results
+            ],
+        }
+        with open(args.output, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+        print(f"\nReport written to {args.output}")
+    return 0
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class QueueFullError(RuntimeError):
+    """Raised when inference work is rejected because the queue is full."""
+
+
+class InferenceExecutor:
+    """
+    Dedicated thread pool for CPU-heavy model calls so they never run on the
+    asyncio event loop.
+
+    Each worker calls `configure_threads(threads_per_worker)` on start-up
+    (by default the machine's cores split evenly between workers) so the
+    backend can cap its intra-op threads and concurrent forwards do not
+    oversubscribe the CPU. At most `max_workers + max_queue` calls may
+    be pending at once; further calls raise `QueueFullError`.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        threads_per_worker: int | None = None,
+        max_queue: int = 16,
+        configure_threads: Callable[[int], None] | None = None,
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.max_workers)
+        self.max_queue = max(0, int(max_queue))
+        self.configure_threads = configure_threads or (lambda num_threads: None)
+
+        self._pool: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._busy_seconds = 0.0
+        self._started_at = time.monotonic()
+        # (loop, future) of `wait=True` callers blocked on a full queue, woken in order as slots free up
+        self._waiters: deque = deque()
+
+    @property
+    def saturated(self) -> bool:
+        return self._queued + self._running >= self.max_workers + self.max_queue
+
+    def start(self) -> None:
+        if self._pool is None:
+            self.configure_threads(self.threads_per_worker)
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="inference",
+                initializer=self.configure_threads,
+                initargs=(self.threads_per_worker,),
+            )
+            self._started_at = time.monotonic()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    async def run(self, fn: Callable[..., Any], *args: Any, wait: bool = False) -> Any:
+        """
+        Run `fn(*args)` on the pool and await its result. When the queue is
+        full, raise `QueueFullError` or, if `wait` is set, wait until a slot
+        frees up (used by bulk callers that prefer back-pressure to failure).
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if not self.saturated:
+                    self._queued += 1
+                    break
+                if not wait:
+                    self._rejected += 1
+                    raise QueueFullError("Inference queue is full, retry shortly.")
+                waiter = (loop, loop.create_future())
+                self._waiters.append(waiter)
+            try:
+                await waiter[1]
+            except asyncio.CancelledError:
+                with self._lock:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    elif waiter[1].done() and not waiter[1].cancelled():
+                        # Woken just as it was cancelled: pass the slot on.
+                        self._wake_next()
+                raise
+
+        future = self._pool.submit(self._call, fn, args)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _wake_next(self) -> None:
+        # Caller holds the lock.
+        while self._waiters:
+            loop, waiter = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(self._resolve, waiter)
+                return
+            except RuntimeError:
+                # Its event loop has closed; nobody is waiting on it any more.
+                continue
+
+    def _resolve(self, waiter: asyncio.Future) -> None:
+        if waiter.done():
+            # Cancelled after it was picked; hand the slot to the next one.
+            with self._lock:
+                self._wake_next()
+        else:
+            waiter.set_result(None)
+
+    def _on_done(self, future) -> None:
+        # A call cancelled before a worker picked it up never reaches _call.
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+                self._wake_next()
+
+    def _call(self, fn: Callable[..., Any], args: tuple) -> Any:
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        started = time.monotonic()
+        failed = False
+        try:
+            return fn(*args)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            with self._lock:
+                self._running -= 1
+                self._wake_next()
+                self._busy_seconds += elapsed
+                if failed:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+
+    def stats(self) -> Dict[str, float | int]:
+        with self._lock:
+            uptime = max(time.monotonic() - self._started_at, 1e-9)
+            return {
+                "max_workers": self.max_workers,
+                "threads_per_worker": self.threads_per_worker,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "busy_seconds": round(self._busy_seconds, 4),
+                "utilization": round(min(1.0, self._busy_seconds / (uptime * self.max_workers)), 4),
+            }
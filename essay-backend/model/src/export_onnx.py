@@ -0,0 +1,110 @@
+"""
+Export a trained checkpoint to ONNX for the ONNX Runtime serving backend.
+
+    python -m src.export_onnx [checkpoint] [output.onnx]
+
+Writes the graph (dynamic batch and sequence axes, inputs `tokens` and
+`lengths`) plus a `.vocab.json` file next to it, then checks numerical parity
+against the PyTorch model on the validation split.
+"""
+import inspect
+import json
+import sys
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader
+
+from src.data_loader import load_dataset
+from src.dataset import EssayDataset, collate_essays
+from src.deep_model import EssayCNNBiLSTM
+from src.inference import vocab_from_dict, vocab_sidecar_path
+
+OPSET_VERSION = 17
+PARITY_ATOL = 1e-3
+
+
+class _ExportWrapper(nn.Module):
+    """Gives the exported graph a flat (batch,) output regardless of batch size."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, tokens, lengths):
+        return self.model(tokens, lengths).reshape(-1)
+
+
+def export_model(model, onnx_path):
+    # The TorchScript exporter maps packed sequences onto the ONNX LSTM
+    # `sequence_lens` input; newer torch releases default to the dynamo
+    # exporter, which cannot trace pack_padded_sequence.
+    extra = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    model.eval()
+    tokens = torch.randint(2, model.embedding.num_embeddings, (2, 16), dtype=torch.long)
+    lengths = torch.tensor([16, 9], dtype=torch.long)
+    torch.onnx.export(
+        _ExportWrapper(model),
+        (tokens, lengths),
+        onnx_path,
+        input_names=["tokens", "lengths"],
+        output_names=["score"],
+        dynamic_axes={
+            "tokens": {0: "batch", 1: "sequence"},
+            "lengths": {0: "batch"},
+            "score": {0: "batch"},
+        },
+        opset_version=OPSET_VERSION,
+        **extra,
+    )
+
+
+def check_parity(model, onnx_path, data_loader):
+    """Return (max_abs_diff, mean_abs_diff) between PyTorch and ONNX Runtime predictions."""
+    import onnxruntime as ort
+
+    session = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+    diffs = []
+    model.eval()
+    with torch.no_grad():
+        for essays, lengths, _ in data_loader:
+            expected = model(essays, lengths).reshape(-1).numpy()
+            (actual,) = session.run(None, {"tokens": essays.numpy(), "lengths": lengths.numpy()})
+            diffs.append(np.abs(expected - np.asarray(actual).reshape(-1)))
+    diffs = np.concatenate(diffs)
+    return float(diffs.max()), float(diffs.mean())
+
+
+def main():
+    data_path = "data/training_set_rel3.tsv"
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "models/deep_essay_grader.pt"
+    onnx_path = sys.argv[2] if len(sys.argv) > 2 else model_path.rsplit(".", 1)[0] + ".onnx"
+
+    checkpoint = torch.load(model_path, map_location=torch.device("cpu"))
+    vocab = vocab_from_dict(checkpoint["vocab"])
+    model = EssayCNNBiLSTM(vocab_size=len(vocab), embed_dim=128, hidden_dim=128, num_layers=1)
+    model.load_state_dict(checkpoint["model_state"])
+    model.eval()
+
+    print(f"Exporting {model_path} -> {onnx_path}")
+    export_model(model, onnx_path)
+    vocab_path = vocab_sidecar_path(onnx_path)
+    with open(vocab_path, "w", encoding="utf-8") as fp:
+        json.dump(vocab.word2idx, fp)
+    print(f"Vocabulary saved to {vocab_path}")
+
+    print("Checking parity on the validation split...")
+    _, X_val, _, y_val = load_dataset(data_path, split=checkpoint.get("split_scheme", "sklearn"))
+    val_loader = DataLoader(EssayDataset(X_val, y_val, vocab, max_len=300), batch_size=32, collate_fn=collate_essays)
+    max_diff, mean_diff = check_parity(model, onnx_path, val_loader)
+    print(f"Max abs diff: {max_diff:.6f} | Mean abs diff: {mean_diff:.6f} (tolerance {PARITY_ATOL})")
+
+    if max_diff > PARITY_ATOL:
+        print("Parity check FAILED")
+        sys.exit(1)
+    print("Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
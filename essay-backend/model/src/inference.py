@@ -0,0 +1,155 @@
+"""
+Serving backends for EssayCNNBiLSTM.
+
+Both backends take padded id arrays plus per-essay lengths and return raw
+0-60 scores. Heavy runtimes are imported lazily so an ONNX Runtime node never
+loads torch.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+from src.cache import file_digest
+from src.vocab import Vocab
+
+BACKENDS = ("torch", "onnx")
+
+
+def vocab_from_dict(word2idx: Dict[str, int]) -> Vocab:
+    vocab = Vocab()
+    vocab.word2idx = word2idx
+    vocab.idx2word = {idx: word for word, idx in word2idx.items()}
+    return vocab
+
+
+def vocab_sidecar_path(onnx_path: str) -> str:
+    """Vocabulary file written next to an exported ONNX graph."""
+    return str(Path(onnx_path).with_suffix(".vocab.json"))
+
+
+def load_checkpoint(model_path: str, map_location):
+    """
+    Weights-only `torch.load` that memory-maps the file, so tensors are paged in
+    on demand (and shared through the page cache) instead of read up front.
+    """
+    import torch
+
+    try:
+        return torch.load(model_path, map_location=map_location, mmap=True, weights_only=True)
+    except RuntimeError as exc:
+        # Checkpoints in the legacy (non-zip) format cannot be memory-mapped.
+        if "mmap" not in str(exc):
+            raise
+        return torch.load(model_path, map_location=map_location, weights_only=True)
+
+
+class TorchBackend:
+    """Runs the PyTorch checkpoint (`model_state` plus `vocab`), optionally int8-quantized."""
+
+    name = "torch"
+
+    def __init__(self, model_path: str, precision: str = "float32"):
+        import torch
+
+        from src.deep_model import EssayCNNBiLSTM
+
+        if precision not in ("float32", "int8"):
+            raise ValueError(f"Unsupported MODEL_PRECISION '{precision}'. Use 'float32' or 'int8'.")
+
+        # Dynamically quantized kernels only run on CPU.
+        use_cuda = torch.cuda.is_available() and precision == "float32"
+        self.device = torch.device("cuda" if use_cuda else "cpu")
+
+        checkpoint = load_checkpoint(model_path, self.device)
+        vocab_dict = checkpoint.get("vocab")
+        model_state = checkpoint.get("model_state")
+
+        if not vocab_dict or not model_state:
+            raise ValueError("Checkpoint is missing 'vocab' or 'model_state' keys.")
+
+        self.vocab = vocab_from_dict(vocab_dict)
+        # Build on the meta device and adopt the checkpoint tensors, skipping
+        # random initialisation and a copy of every weight.
+        with torch.device("meta"):
+            model = EssayCNNBiLSTM(vocab_size=len(self.vocab), embed_dim=128, hidden_dim=128, num_layers=1)
+        model.load_state_dict(model_state, assign=True)
+        model.to(self.device)
+        model.eval()
+        if precision == "int8":
+            from src.quantize import quantize_model
+
+            model = quantize_model(model)
+
+        self.model = model
+        self.precision = precision
+        self.checkpoint_id = f"{file_digest(model_path)}:{precision}"
+        # Serialized weights; an upper bound for int8, whose packed weights are smaller.
+        self.memory_bytes = os.path.getsize(model_path)
+
+    @staticmethod
+    def configure_threads(num_threads: int) -> None:
+        import torch
+
+        # OpenMP thread counts are per calling thread, so every pool worker
+        # must set its own intra-op budget.
+        torch.set_num_threads(num_threads)
+
+    def predict(self, ids: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        import torch
+
+        tensor = torch.from_numpy(ids).to(self.device)
+        with torch.no_grad():
+            preds = self.model(tensor, torch.from_numpy(lengths)).reshape(-1)
+        return preds.cpu().numpy()
+
+
+class OnnxBackend:
+    """Runs a graph exported by `python -m src.export_onnx` with ONNX Runtime on CPU."""
+
+    name = "onnx"
+
+    def __init__(self, onnx_path: str, intra_op_threads: int | None = None):
+        import onnxruntime as ort
+
+        vocab_path = vocab_sidecar_path(onnx_path)
+        if not os.path.exists(vocab_path):
+            raise FileNotFoundError(f"Vocabulary file not found at '{vocab_path}'. Re-run the ONNX export.")
+        with open(vocab_path, "r", encoding="utf-8") as fp:
+            self.vocab = vocab_from_dict(json.load(fp))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.precision = "float32"
+        self.checkpoint_id = f"{file_digest(onnx_path)}:onnx"
+        self.memory_bytes = os.path.getsize(onnx_path)
+
+    @staticmethod
+    def configure_threads(num_threads: int) -> None:
+        # ONNX Runtime sizes its pool per session (see intra_op_threads).
+        pass
+
+    def predict(self, ids: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        (preds,) = self.session.run(None, {"tokens": ids, "lengths": lengths})
+        return np.asarray(preds, dtype=np.float32).reshape(-1)
+
+
+def load_backend(kind: str, model_path: str, onnx_path: str, precision: str = "float32", intra_op_threads: int | None = None):
+    if kind not in BACKENDS:
+        raise ValueError(f"Unsupported INFERENCE_BACKEND '{kind}'. Use one of {', '.join(BACKENDS)}.")
+
+    path = onnx_path if kind == "onnx" else model_path
+    if not os.path.exists(path):
+        env_name = "ONNX_MODEL_PATH" if kind == "onnx" else "MODEL_PATH"
+        raise FileNotFoundError(
+            f"Model checkpoint not found at '{path}'. Train the model first or update {env_name}."
+        )
+
+    if kind == "onnx":
+        return OnnxBackend(onnx_path, intra_op_threads=intra_op_threads)
+    return TorchBackend(model_path, precision=precision)
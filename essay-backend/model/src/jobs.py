@@ -0,0 +1,438 @@
+"""
+Durable asynchronous grading jobs.
+
+A job is a set of essays submitted in one request. `JobStore` persists every
+job and every essay (its request, state and graded result) in SQLite, so
+nothing is lost when the service restarts. `JobRunner` is a background task
+that claims pending essays in batches, grades them and commits each batch's
+results before claiming the next.
+
+Claims are leases: a claimed essay carries its runner's token and an expiry.
+Several workers (see src/serve.py) can therefore share one store without
+grading an essay twice, and essays claimed by a runner that died are picked
+up again once their lease runs out. A runner that shuts down cleanly releases
+its leases straight away, so a restarted service resumes where it stopped.
+A runner renews its leases while a batch is being graded, so a slow batch is
+not handed to another worker. A batch that fails is retried after
+`retry_delay` seconds, up to `max_attempts` times, before its essays are
+marked failed.
+
+Each essay that finishes gets the next `done_seq` of its job. Results are paged
+by that sequence rather than by position, so an essay that finishes after a
+later one is never skipped by a client that already read past it.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Sequence, Tuple
+from uuid import uuid4
+
+JOB_STATES = ("queued", "running", "completed", "cancelled")
+FINISHED_STATES = {"completed", "cancelled"}
+# Claimed essay: (item seq, job id, index in the job, grade request)
+JobItem = Tuple[int, str, int, Dict[str, Any]]
+
+
+def _now_iso() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+
+class JobStore:
+    """Jobs and their essays in an SQLite database in WAL mode."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        if hasattr(os, "register_at_fork"):
+            # SQLite connections must not be used across fork.
+            os.register_at_fork(after_in_child=self._reset_connections)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, "
+            "status TEXT NOT NULL, "
+            "created_at TEXT NOT NULL, "
+            "finished_at TEXT, "
+            "total INTEGER NOT NULL, "
+            "completed INTEGER NOT NULL DEFAULT 0, "
+            "failed INTEGER NOT NULL DEFAULT 0, "
+            "cancelled INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_items ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "job_id TEXT NOT NULL, "
+            "idx INTEGER NOT NULL, "
+            "state TEXT NOT NULL, "
+            "request TEXT NOT NULL, "
+            "result TEXT, "
+            "error TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "lease_owner TEXT, "
+            "lease_until REAL NOT NULL DEFAULT 0, "
+            "done_seq INTEGER)"
+        )
+        # Stores created before done_seq: number finished essays in submission order.
+        with self._transaction() as migrate:
+            columns = {row[1] for row in migrate.execute("PRAGMA table_info(job_items)")}
+            if "done_seq" not in columns:
+                migrate.execute("ALTER TABLE job_items ADD COLUMN done_seq INTEGER")
+                migrate.execute("UPDATE job_items SET done_seq = idx + 1 WHERE state != 'pending'")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_job_items_job ON job_items (job_id, idx)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_job_items_pending ON job_items (state, seq)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_job_items_done ON job_items (job_id, done_seq)")
+
+    def _reset_connections(self) -> None:
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @staticmethod
+    def _job(row: tuple) -> Dict[str, Any]:
+        job_id, state, created_at, finished_at, total, completed, failed, cancelled = row
+        return {
+            "job_id": job_id,
+            "status": state,
+            "created_at": created_at,
+            "finished_at": finished_at,
+            "total": total,
+            "completed": completed,
+            "failed": failed,
+            "cancelled": cancelled,
+            "pending": total - completed - failed - cancelled,
+        }
+
+    def _get(self, conn: sqlite3.Connection, job_id: str) -> Dict[str, Any] | None:
+        row = conn.execute(
+            "SELECT job_id, status, created_at, finished_at, total, completed, failed, cancelled FROM jobs WHERE job_id = ?",
+            (job_id,),
+        ).fetchone()
+        return self._job(row) if row is not None else None
+
+    def _finish(self, conn: sqlite3.Connection, job_ids: Sequence[str]) -> None:
+        conn.executemany(
+            "UPDATE jobs SET status = 'completed', finished_at = ? "
+            "WHERE job_id = ? AND status IN ('queued', 'running') AND completed + failed + cancelled >= total",
+            [(_now_iso(), job_id) for job_id in set(job_ids)],
+        )
+
+    def create(self, requests: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+        """Persist a new job holding `requests` (one grade request per essay) and return its status."""
+        job_id = uuid4().hex
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, created_at, total) VALUES (?, 'queued', ?, ?)",
+                (job_id, _now_iso(), len(requests)),
+            )
+            conn.executemany(
+                "INSERT INTO job_items (job_id, idx, state, request) VALUES (?, ?, 'pending', ?)",
+                [(job_id, index, json.dumps(request)) for index, request in enumerate(requests)],
+            )
+            self._finish(conn, [job_id])
+            return self._get(conn, job_id)
+
+    def get(self, job_id: str) -> Dict[str, Any] | None:
+        return self._get(self._connect(), job_id)
+
+    def claim(self, owner: str, limit: int, lease_seconds: float) -> List[JobItem]:
+        """Lease up to `limit` pending essays to `owner`, oldest first."""
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT seq, job_id, idx, request FROM job_items "
+                "WHERE state = 'pending' AND lease_until <= ? ORDER BY seq LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            if not rows:
+                return []
+            conn.executemany(
+                "UPDATE job_items SET lease_owner = ?, lease_until = ? WHERE seq = ?",
+                [(owner, now + lease_seconds, row[0]) for row in rows],
+            )
+            conn.executemany(
+                "UPDATE jobs SET status = 'running' WHERE job_id = ? AND status = 'queued'",
+                [(job_id,) for job_id in {row[1] for row in rows}],
+            )
+        return [(seq, job_id, index, json.loads(request)) for seq, job_id, index, request in rows]
+
+    @staticmethod
+    def _next_done_seq(conn: sqlite3.Connection, job_id: str) -> int:
+        # Callers hold the write lock, so the sequence cannot be handed out twice.
+        return conn.execute(
+            "SELECT COALESCE(MAX(done_seq), 0) + 1 FROM job_items WHERE job_id = ?", (job_id,)
+        ).fetchone()[0]
+
+    def renew(self, owner: str, seqs: Sequence[int], lease_seconds: float) -> int:
+        """Extend `owner`'s leases on essays it still holds; returns how many were renewed."""
+        until = time.time() + lease_seconds
+        with self._transaction() as conn:
+            return sum(
+                conn.execute(
+                    "UPDATE job_items SET lease_until = ? WHERE seq = ? AND state = 'pending' AND lease_owner = ?",
+                    (until, seq, owner),
+                ).rowcount
+                for seq in seqs
+            )
+
+    def _settle(self, conn: sqlite3.Connection, owner: str, seq: int, state: str, result: str | None,
+                error: str | None) -> str | None:
+        """Move one leased essay to `state`; returns its job id, or None if the lease was lost."""
+        row = conn.execute(
+            "SELECT job_id FROM job_items WHERE seq = ? AND state = 'pending' AND lease_owner = ?", (seq, owner)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE job_items SET state = ?, result = ?, error = ?, lease_owner = NULL, done_seq = ? WHERE seq = ?",
+            (state, result, error, self._next_done_seq(conn, row[0]), seq),
+        )
+        conn.execute(f"UPDATE jobs SET {state} = {state} + 1 WHERE job_id = ?", (row[0],))
+        return row[0]
+
+    def complete(self, owner: str, results: Sequence[Tuple[int, str]]) -> int:
+        """Store graded results (item seq, response JSON) for essays `owner` still holds; returns how many."""
+        with self._transaction() as conn:
+            job_ids = [self._settle(conn, owner, seq, "completed", result, None) for seq, result in results]
+            job_ids = [job_id for job_id in job_ids if job_id is not None]
+            self._finish(conn, job_ids)
+        return len(job_ids)
+
+    def release(self, owner: str, seqs: Sequence[int], error: str, max_attempts: int, retry_delay: float) -> int:
+        """
+        Record a failed attempt on essays `owner` holds: they are retried after
+        `retry_delay` seconds, or marked failed after `max_attempts`. Returns
+        how many were marked failed.
+        """
+        failed = []
+        with self._transaction() as conn:
+            for seq in seqs:
+                row = conn.execute(
+                    "SELECT attempts FROM job_items WHERE seq = ? AND state = 'pending' AND lease_owner = ?", (seq, owner)
+                ).fetchone()
+                if row is None:
+                    continue
+                if row[0] + 1 >= max_attempts:
+                    failed.append(self._settle(conn, owner, seq, "failed", None, error))
+                else:
+                    conn.execute(
+                        "UPDATE job_items SET attempts = attempts + 1, error = ?, lease_owner = NULL, lease_until = ? "
+                        "WHERE seq = ?",
+                        (error, time.time() + retry_delay, seq),
+                    )
+            self._finish(conn, failed)
+        return len(failed)
+
+    def release_owner(self, owner: str) -> None:
+        """Hand every essay `owner` still holds back to the queue, e.g. on shutdown."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE job_items SET lease_owner = NULL, lease_until = 0 WHERE state = 'pending' AND lease_owner = ?",
+                (owner,),
+            )
+
+    def cancel(self, job_id: str) -> Dict[str, Any] | None:
+        """Drop a job's pending essays; graded results are kept. Returns the job, or None if unknown."""
+        with self._transaction() as conn:
+            job = self._get(conn, job_id)
+            if job is None or job["status"] in FINISHED_STATES:
+                return job
+            pending = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT seq FROM job_items WHERE job_id = ? AND state = 'pending' ORDER BY idx", (job_id,)
+                )
+            ]
+            first = self._next_done_seq(conn, job_id)
+            conn.executemany(
+                "UPDATE job_items SET state = 'cancelled', lease_owner = NULL, done_seq = ? WHERE seq = ?",
+                [(first + offset, seq) for offset, seq in enumerate(pending)],
+            )
+            dropped = len(pending)
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ?, cancelled = cancelled + ? WHERE job_id = ?",
+                (_now_iso(), dropped, job_id),
+            )
+            return self._get(conn, job_id)
+
+    def results(self, job_id: str, after: int = 0, limit: int = 100) -> Tuple[List[Dict[str, Any]], int | None]:
+        """
+        Essays of a job in the order they finished, after completion sequence
+        `after`, plus the cursor to pass next. The cursor is None once the job
+        is finished and every essay has been returned.
+        """
+        conn = self._connect()
+        # Read the status first: a job finished by now has every essay numbered.
+        job = self._get(conn, job_id)
+        rows = conn.execute(
+            "SELECT done_seq, idx, state, result, error FROM job_items "
+            "WHERE job_id = ? AND done_seq > ? ORDER BY done_seq LIMIT ?",
+            (job_id, after, limit + 1),
+        ).fetchall()
+        items = [
+            {
+                "index": index,
+                "status": state,
+                "result": json.loads(result) if result is not None else None,
+                "error": error,
+            }
+            for _, index, state, result, error in rows[:limit]
+        ]
+        if len(rows) <= limit and (job is None or job["status"] in FINISHED_STATES):
+            return items, None
+        return items, rows[:limit][-1][0] if items else after
+
+    def stats(self) -> Dict[str, int]:
+        counts = dict(self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        pending = self._connect().execute(
+            "SELECT COALESCE(SUM(total - completed - failed - cancelled), 0) FROM jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()[0]
+        return {**{f"jobs_{state}": counts.get(state, 0) for state in JOB_STATES}, "pending_items": pending}
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class JobRunner:
+    """
+    Background task that drains a JobStore through `grade`, which maps a list
+    of grade requests to one response JSON string per request. One batch is
+    in flight at a time, so bulk jobs never hold more than one inference slot.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        grade: Callable[[List[Dict[str, Any]]], Awaitable[List[str]]],
+        batch_size: int = 32,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+        retry_delay: float = 5.0,
+        poll_interval: float = 1.0,
+    ):
+        self.store = store
+        self.grade = grade
+        self.batch_size = max(1, int(batch_size))
+        self.lease_seconds = max(1.0, float(lease_seconds))
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_delay = max(0.0, float(retry_delay))
+        self.poll_interval = max(0.01, float(poll_interval))
+        # Distinguishes this runner's leases from other workers' and from a previous run's.
+        self.owner = uuid4().hex
+
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+        self.batches = 0
+        self.graded = 0
+        self.failed = 0
+        self.retries = 0
+        self.last_error: str | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def notify(self) -> None:
+        """Wake the runner now rather than at its next poll, e.g. after a submission."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Essays of an interrupted batch go straight back to the queue.
+        await asyncio.to_thread(self.store.release_owner, self.owner)
+
+    async def _idle(self) -> None:
+        try:
+            await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                batch = await asyncio.to_thread(self.store.claim, self.owner, self.batch_size, self.lease_seconds)
+                if not batch:
+                    await self._idle()
+                    continue
+                await self._process(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # A store error must not stop the runner; the leases expire and are retried.
+                self.last_error = f"{type(exc).__name__}: {exc}"
+                await self._idle()
+
+    async def _renew(self, seqs: List[int]) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.store.renew, self.owner, seqs, self.lease_seconds)
+            except Exception as exc:
+                # Keep grading; at worst the lease lapses and another worker repeats the batch.
+                self.last_error = f"{type(exc).__name__}: {exc}"
+
+    async def _process(self, batch: List[JobItem]) -> None:
+        seqs = [seq for seq, _, _, _ in batch]
+        renewal = asyncio.get_running_loop().create_task(self._renew(seqs))
+        try:
+            results = await self.grade([request for _, _, _, request in batch])
+        except Exception as exc:
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            failed = await asyncio.to_thread(
+                self.store.release, self.owner, seqs, str(exc), self.max_attempts, self.retry_delay
+            )
+            self.failed += failed
+            self.retries += len(batch) - failed
+            return
+        finally:
+            renewal.cancel()
+        self.graded += await asyncio.to_thread(self.store.complete, self.owner, list(zip(seqs, results)))
+        self.batches += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "batch_size": self.batch_size,
+            "batches": self.batches,
+            "graded": self.graded,
+            "failed": self.failed,
+            "retries": self.retries,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,124 @@
+"""
+Sliding-window scoring for essays longer than the model's window.
+
+`WindowPlanner.split` cuts each essay's token ids into overlapping windows
+(`window` tokens every `stride`, with the last window flush with the end so
+the tail is always covered). All windows of a batch go through the model in
+one forward pass and `aggregate` folds the window scores back into one score
+per essay, weighting each window by the tokens it covers (a token seen by k
+windows contributes 1/k to each), so overlaps are not double counted.
+
+The per-essay window count is capped by `max_windows` and, when `budget_ms`
+is set, by how many windows fit that budget at the measured cost per window.
+Essays over the cap get that many windows spread evenly across the text
+instead of being truncated.
+"""
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+# Weight of new forward-pass timings in the running cost-per-window estimate
+_COST_SMOOTHING = 0.2
+
+
+def aggregate(scores: np.ndarray, owners: np.ndarray, weights: np.ndarray, count: int) -> np.ndarray:
+    """Weighted mean of window `scores` per owning essay (`owners` holds essay indices)."""
+    totals = np.bincount(owners, weights=scores * weights, minlength=count)
+    return totals / np.bincount(owners, weights=weights, minlength=count)
+
+
+class WindowPlanner:
+    def __init__(self, window: int, stride: int, max_windows: int, budget_ms: float = 0.0):
+        if window < 1 or not 0 < stride <= window:
+            raise ValueError(f"Need 0 < stride <= window, got window={window}, stride={stride}.")
+        self.window = int(window)
+        self.stride = int(stride)
+        self.max_windows = max(1, int(max_windows))
+        self.budget_seconds = max(0.0, float(budget_ms)) / 1000.0
+
+        self._lock = threading.Lock()
+        self._seconds_per_window: float | None = None
+        self.essays = 0
+        self.windows = 0
+        self.capped = 0
+
+    def window_limit(self) -> int:
+        """Windows allowed per essay under `max_windows` and the latency budget."""
+        cost = self._seconds_per_window
+        if not self.budget_seconds or cost is None:
+            return self.max_windows
+        return max(1, min(self.max_windows, int(self.budget_seconds / cost)))
+
+    def natural_count(self, length: int) -> int:
+        """Windows needed to cover `length` tokens at the configured stride."""
+        last = length - self.window
+        return 1 if last <= 0 else -(-last // self.stride) + 1
+
+    def starts(self, length: int, limit: int) -> np.ndarray:
+        """Window start offsets for an essay of `length` tokens."""
+        last = length - self.window
+        if last <= 0:
+            return np.zeros(1, dtype=np.int64)
+        count = self.natural_count(length)
+        if count <= limit:
+            starts = np.arange(count, dtype=np.int64) * self.stride
+            starts[-1] = last
+            return starts
+        return np.unique(np.linspace(0, last, limit).round().astype(np.int64))
+
+    def split(self, id_arrays: Sequence[np.ndarray]) -> Tuple[List[np.ndarray], np.ndarray, np.ndarray]:
+        """
+        Windows of every essay, plus each window's essay index and coverage
+        weight. Short essays are a single window holding the whole essay.
+        """
+        limit = self.window_limit()
+        windows: List[np.ndarray] = []
+        owners: List[int] = []
+        weights: List[float] = []
+        capped = 0
+        for index, ids in enumerate(id_arrays):
+            starts = self.starts(len(ids), limit)
+            capped += self.natural_count(len(ids)) > limit
+            if len(starts) == 1:
+                windows.append(ids[:self.window])
+                owners.append(index)
+                weights.append(1.0)
+                continue
+
+            coverage = np.zeros(len(ids), dtype=np.float64)
+            for start in starts:
+                coverage[start:start + self.window] += 1
+            for start in starts:
+                windows.append(ids[start:start + self.window])
+                owners.append(index)
+                weights.append(float(np.sum(1.0 / coverage[start:start + self.window])))
+
+        with self._lock:
+            self.essays += len(id_arrays)
+            self.windows += len(windows)
+            self.capped += capped
+        return windows, np.asarray(owners, dtype=np.int64), np.asarray(weights, dtype=np.float64)
+
+    def observe(self, windows: int, seconds: float) -> None:
+        """Fold a forward pass over `windows` windows into the cost-per-window estimate."""
+        if windows <= 0:
+            return
+        cost = seconds / windows
+        with self._lock:
+            previous = self._seconds_per_window
+            self._seconds_per_window = cost if previous is None else previous + _COST_SMOOTHING * (cost - previous)
+
+    def stats(self) -> Dict[str, float | int]:
+        with self._lock:
+            return {
+                "window": self.window,
+                "stride": self.stride,
+                "max_windows": self.max_windows,
+                "window_limit": self.window_limit(),
+                "essays": self.essays,
+                "windows": self.windows,
+                "capped_essays": self.capped,
+                "windows_per_essay": round(self.windows / self.essays, 4) if self.essays else 0.0,
+                "seconds_per_window": round(self._seconds_per_window or 0.0, 6),
+            }
@@ -0,0 +1,328 @@
+"""
+In-memory near-duplicate index over graded submissions, scoped per assignment.
+
+An essay is reduced to the set of its word `shingle_size`-grams (words from
+`simple_tokenizer`) and summarised by a MinHash signature of `num_perm`
+32-bit values: the minimum of each of `num_perm` multiply-shift hashes over
+the shingles. The fraction of equal values in two signatures estimates the
+Jaccard similarity of the two shingle sets, so whitespace changes, a changed
+name or a few swapped words leave it close to 1.
+
+Lookups use locality-sensitive hashing: the signature is cut into `bands`
+bands, and each band is hashed to a bucket key. Essays that share any bucket
+are candidates, and only candidates are compared in full against
+`threshold`. A lookup costs a few dict probes plus one vectorised comparison,
+whatever the index size. With the defaults (128 values in 16 bands of 8),
+pairs at 0.85 similarity collide with probability above 0.99, and pairs below
+0.5 almost never do.
+
+At most `max_entries` essays are kept across all assignments; the least
+recently matched or added ones are evicted first. `save` and `restore` move
+the index to and from an .npz snapshot, so a restart does not start cold;
+saves from several workers are merged rather than overwriting each other.
+"""
+import io
+import json
+import os
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from src.vocab import simple_tokenizer
+
+try:  # POSIX advisory locks; elsewhere concurrent savers are not serialised
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+# 2: payloads no longer carry the student's name
+SNAPSHOT_VERSION = 2
+# Odd 64-bit multipliers that mix consecutive word hashes into one shingle hash
+_SHINGLE_MIX = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93],
+                        dtype=np.uint64)
+
+
+class NearDupMatch(NamedTuple):
+    assignment_id: str
+    slot: int
+    # Stamp of the essay in `slot` when it matched; the slot may since have been reused
+    stamp: int
+    similarity: float
+    payload: Any
+
+
+class _AssignmentIndex:
+    """Signatures and LSH buckets of one assignment; slots of evicted essays are reused."""
+
+    def __init__(self, num_perm: int, bands: int, band_mix: np.ndarray):
+        self.rows = num_perm // bands
+        self.band_mix = band_mix
+        self.signatures = np.zeros((16, num_perm), dtype=np.uint32)
+        self.payloads: List[Any] = []
+        self.stamps: List[int] = []
+        self.free: List[int] = []
+        # band -> bucket key -> slot, or list of slots when several essays share it
+        self.buckets: List[Dict[int, int | List[int]]] = [{} for _ in range(bands)]
+        self.size = 0
+
+    def band_keys(self, signature: np.ndarray) -> List[int]:
+        bands = signature.reshape(len(self.buckets), self.rows).astype(np.uint64)
+        return (bands * self.band_mix).sum(axis=1, dtype=np.uint64).tolist()
+
+    def candidates(self, keys: List[int]) -> List[int]:
+        found = set()
+        for buckets, key in zip(self.buckets, keys):
+            slots = buckets.get(key)
+            if slots is None:
+                continue
+            if isinstance(slots, int):
+                found.add(slots)
+            else:
+                found.update(slots)
+        return list(found)
+
+    def add(self, signature: np.ndarray, keys: List[int], payload: Any, stamp: int) -> int:
+        if self.free:
+            slot = self.free.pop()
+            self.payloads[slot] = payload
+            self.stamps[slot] = stamp
+        else:
+            slot = len(self.payloads)
+            self.payloads.append(payload)
+            self.stamps.append(stamp)
+            if slot >= len(self.signatures):
+                grown = np.zeros((len(self.signatures) * 2, self.signatures.shape[1]), dtype=np.uint32)
+                grown[:slot] = self.signatures[:slot]
+                self.signatures = grown
+        self.signatures[slot] = signature
+        for buckets, key in zip(self.buckets, keys):
+            slots = buckets.get(key)
+            if slots is None:
+                buckets[key] = slot
+            elif isinstance(slots, int):
+                buckets[key] = [slots, slot]
+            else:
+                slots.append(slot)
+        self.size += 1
+        return slot
+
+    def remove(self, slot: int) -> None:
+        for buckets, key in zip(self.buckets, self.band_keys(self.signatures[slot])):
+            slots = buckets.get(key)
+            if isinstance(slots, int):
+                del buckets[key]
+            elif slots is not None:
+                slots.remove(slot)
+                if len(slots) == 1:
+                    buckets[key] = slots[0]
+        self.payloads[slot] = None
+        self.free.append(slot)
+        self.size -= 1
+
+
+class NearDupIndex:
+    def __init__(self, num_perm: int = 128, bands: int = 16, shingle_size: int = 3, threshold: float = 0.85,
+                 max_entries: int = 50000, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands}).")
+        self.num_perm = int(num_perm)
+        self.bands = int(bands)
+        self.shingle_size = max(1, min(int(shingle_size), len(_SHINGLE_MIX)))
+        self.threshold = float(threshold)
+        self.max_entries = max(1, int(max_entries))
+        self.seed = int(seed)
+
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hash family: (a * x + b) >> 32 with odd a.
+        self._a = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+        # Odd per-position multipliers that fold a band's values into one bucket key
+        self._band_mix = rng.integers(0, 1 << 63, num_perm // bands, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+        self._lock = threading.Lock()
+        self._indexes: Dict[str, _AssignmentIndex] = {}
+        self._lru: "OrderedDict[Tuple[str, int], None]" = OrderedDict()
+        # Incremented per added essay, so a stale match is told apart from its slot's new essay
+        self._stamp = 0
+        self.lookups = 0
+        self.matches = 0
+        self.evictions = 0
+
+    def params(self) -> Dict[str, int]:
+        return {"num_perm": self.num_perm, "bands": self.bands, "shingle_size": self.shingle_size, "seed": self.seed}
+
+    def signature(self, text: str) -> np.ndarray | None:
+        """MinHash signature of `text`'s word shingles, or None if it has no words."""
+        words = simple_tokenizer(text)
+        if not words:
+            return None
+        hashes = np.fromiter((zlib.crc32(word.encode()) for word in words), dtype=np.uint64, count=len(words))
+        size = min(self.shingle_size, len(hashes))
+        count = len(hashes) - size + 1
+        shingles = np.zeros(count, dtype=np.uint64)
+        for offset in range(size):
+            shingles += hashes[offset:offset + count] * _SHINGLE_MIX[offset]
+        hashed = np.multiply.outer(np.unique(shingles), self._a)
+        hashed += self._b
+        # The shift is monotonic, so it can follow the minimum instead of touching every hash.
+        return (hashed.min(axis=0) >> np.uint64(32)).astype(np.uint32)
+
+    def lookup(self, assignment_id: str, signature: np.ndarray) -> NearDupMatch | None:
+        """Most similar indexed essay of `assignment_id` at or above `threshold`, if any."""
+        with self._lock:
+            self.lookups += 1
+            index = self._indexes.get(assignment_id)
+            if index is None:
+                return None
+            slots = index.candidates(index.band_keys(signature))
+            if not slots:
+                return None
+            similarities = (index.signatures[slots] == signature).mean(axis=1)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            slot = slots[best]
+            self._lru.move_to_end((assignment_id, slot))
+            self.matches += 1
+            return NearDupMatch(assignment_id, slot, index.stamps[slot], float(similarities[best]), index.payloads[slot])
+
+    def add(self, assignment_id: str, signature: np.ndarray, payload: Any) -> None:
+        with self._lock:
+            index = self._indexes.get(assignment_id)
+            if index is None:
+                index = self._indexes[assignment_id] = _AssignmentIndex(self.num_perm, self.bands, self._band_mix)
+            self._stamp += 1
+            slot = index.add(signature, index.band_keys(signature), payload, self._stamp)
+            self._lru[(assignment_id, slot)] = None
+            while len(self._lru) > self.max_entries:
+                self._evict()
+
+    def update(self, match: NearDupMatch, payload: Any) -> None:
+        """
+        Replace the payload of a matched essay, e.g. once it has been re-graded.
+        Does nothing if that essay has been evicted since, even if its slot
+        now holds another one.
+        """
+        with self._lock:
+            index = self._indexes.get(match.assignment_id)
+            if (index is not None and (match.assignment_id, match.slot) in self._lru
+                    and index.stamps[match.slot] == match.stamp):
+                index.payloads[match.slot] = payload
+
+    def _evict(self) -> None:
+        (assignment_id, slot), _ = self._lru.popitem(last=False)
+        index = self._indexes[assignment_id]
+        index.remove(slot)
+        if not index.size:
+            del self._indexes[assignment_id]
+        self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    def _entries(self) -> List[Tuple[str, np.ndarray, Any]]:
+        """(assignment, signature, payload) of every entry, least recently used first."""
+        with self._lock:
+            return [
+                (assignment_id, self._indexes[assignment_id].signatures[slot].copy(),
+                 self._indexes[assignment_id].payloads[slot])
+                for assignment_id, slot in self._lru
+            ]
+
+    def _read(self, path: str) -> List[Tuple[str, np.ndarray, Any]]:
+        with np.load(path, allow_pickle=False) as snapshot:
+            meta = json.loads(str(snapshot["meta"]))
+            if meta.pop("version", None) != SNAPSHOT_VERSION or meta != self.params():
+                raise ValueError(f"Near-duplicate snapshot '{path}' was built with different parameters: {meta}.")
+            assignments = snapshot["assignments"].tolist()
+            owners = snapshot["owners"].tolist()
+            signatures = snapshot["signatures"]
+            payloads = snapshot["payloads"].tolist()
+        entries = []
+        for owner, signature, payload in zip(owners, signatures, payloads):
+            # JSON turns tuples into lists; payloads are read back as tuples.
+            decoded = json.loads(payload)
+            entries.append((assignments[owner], signature, tuple(decoded) if isinstance(decoded, list) else decoded))
+        return entries
+
+    def save(self, path: str) -> int:
+        """
+        Merge this index into the snapshot at `path` and replace it atomically;
+        returns the number of entries written. Under the pre-fork server every
+        worker saves to the same path, so writers take turns under a file lock
+        and each keeps the entries the others wrote (up to `max_entries`,
+        newest kept), rather than the last one overwriting the rest.
+        """
+        entries = self._entries()
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        lock_fd = os.open(f"{path}.lock", os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            if os.path.exists(path):
+                try:
+                    existing = self._read(path)
+                except (OSError, ValueError, KeyError):
+                    # Unreadable or built with other parameters: replaced by this index.
+                    existing = []
+                own = {(assignment_id, signature.tobytes()) for assignment_id, signature, _ in entries}
+                entries = [
+                    entry for entry in existing if (entry[0], entry[1].tobytes()) not in own
+                ] + entries
+            entries = entries[-self.max_entries:]
+            self._write(path, directory, entries)
+        finally:
+            os.close(lock_fd)
+        return len(entries)
+
+    def _write(self, path: str, directory: str, entries: List[Tuple[str, np.ndarray, Any]]) -> None:
+        assignments = sorted({assignment_id for assignment_id, _, _ in entries})
+        positions = {assignment_id: i for i, assignment_id in enumerate(assignments)}
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            meta=np.array(json.dumps({"version": SNAPSHOT_VERSION, **self.params()})),
+            assignments=np.array(assignments, dtype=str),
+            owners=np.array([positions[assignment_id] for assignment_id, _, _ in entries], dtype=np.int32),
+            signatures=np.stack([signature for _, signature, _ in entries]) if entries else
+            np.zeros((0, self.num_perm), dtype=np.uint32),
+            payloads=np.array([json.dumps(payload) for _, _, payload in entries], dtype=str),
+        )
+        # A private temporary file, so concurrent writers never share one.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                fp.write(buffer.getvalue())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def restore(self, path: str) -> int:
+        """
+        Add the entries of a snapshot written by `save`; returns how many were
+        added. Raises ValueError if it was built with different hashing parameters.
+        """
+        entries = self._read(path)
+        for assignment_id, signature, payload in entries:
+            self.add(assignment_id, signature, payload)
+        return len(entries)
+
+    def stats(self) -> Dict[str, float | int]:
+        with self._lock:
+            entries = len(self._lru)
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "assignments": len(self._indexes),
+                "lookups": self.lookups,
+                "matches": self.matches,
+                "evictions": self.evictions,
+                "signature_bytes": sum(index.signatures.nbytes for index in self._indexes.values()),
+            }
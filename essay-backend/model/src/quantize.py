@@ -0,0 +1,106 @@
+"""
+Int8 CPU inference for EssayCNNBiLSTM.
+
+`quantize_model` folds each Conv1d+BatchNorm pair for eval and applies dynamic
+int8 quantization to the LSTM and Linear layers. Running this module compares
+the quantized model against the float model on the validation split:
+
+    python -m src.quantize [checkpoint]
+"""
+import copy
+import io
+import sys
+import time
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+# Data loading and evaluation (pandas, DataLoader) are imported in the report
+# functions only, so serving an int8 model imports just torch.
+
+CONV_BN_PAIRS = (("conv1", "bn1"), ("conv2", "bn2"), ("conv3", "bn3"))
+
+
+def fold_conv_bn(model):
+    """Fold every BatchNorm into the preceding Conv1d; the model must be in eval mode."""
+    for conv_name, bn_name in CONV_BN_PAIRS:
+        conv, bn = getattr(model, conv_name), getattr(model, bn_name)
+        if isinstance(bn, nn.Identity):
+            continue
+        setattr(model, conv_name, fuse_conv_bn_eval(conv, bn))
+        setattr(model, bn_name, nn.Identity())
+    return model
+
+
+def quantize_model(model):
+    """Return an int8 copy of a float model for CPU inference."""
+    model = copy.deepcopy(model).cpu().eval()
+    fold_conv_bn(model)
+    return torch.ao.quantization.quantize_dynamic(model, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+
+
+def model_size_bytes(model):
+    """Serialized size of the model's state dict."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def _timed_evaluate(model, data_loader, device):
+    from src.evaluate import evaluate_model
+
+    start = time.perf_counter()
+    results = evaluate_model(model, data_loader, device)
+    return results, time.perf_counter() - start
+
+
+def main():
+    from torch.utils.data import DataLoader
+
+    from src.data_loader import load_dataset
+    from src.dataset import EssayDataset, Vocab, collate_essays
+    from src.deep_model import EssayCNNBiLSTM
+
+    data_path = "data/training_set_rel3.tsv"
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "models/deep_essay_grader.pt"
+    device = torch.device("cpu")
+
+    # Load checkpoint, then the validation data it was split with
+    checkpoint = torch.load(model_path, map_location=device)
+    _, X_val, _, y_val = load_dataset(data_path, split=checkpoint.get("split_scheme", "sklearn"))
+
+    # Rebuild vocab
+    vocab = Vocab()
+    vocab.word2idx = checkpoint["vocab"]
+    vocab.idx2word = {idx: word for word, idx in vocab.word2idx.items()}
+
+    val_dataset = EssayDataset(X_val, y_val, vocab, max_len=300)
+    val_loader = DataLoader(val_dataset, batch_size=32, collate_fn=collate_essays)
+
+    float_model = EssayCNNBiLSTM(vocab_size=len(vocab), embed_dim=128, hidden_dim=128, num_layers=1)
+    float_model.load_state_dict(checkpoint["model_state"])
+    float_model.eval()
+    int8_model = quantize_model(float_model)
+
+    float_results, float_seconds = _timed_evaluate(float_model, val_loader, device)
+    int8_results, int8_seconds = _timed_evaluate(int8_model, val_loader, device)
+
+    names = ["RMSE", "MAE", "Within 5 points (%)", "Within 10 points (%)", "Within 15 points (%)"]
+    print("\n" + "=" * 70)
+    print("INT8 QUANTIZATION REPORT")
+    print("=" * 70)
+    print(f"{'Metric':<24}{'float32':>14}{'int8':>14}{'delta':>14}")
+    for name, float_value, int8_value in zip(names, float_results[:5], int8_results[:5]):
+        print(f"{name:<24}{float_value:>14.4f}{int8_value:>14.4f}{int8_value - float_value:>+14.4f}")
+
+    float_size = model_size_bytes(float_model) / 1e6
+    int8_size = model_size_bytes(int8_model) / 1e6
+    print(f"{'Model size (MB)':<24}{float_size:>14.2f}{int8_size:>14.2f}{int8_size - float_size:>+14.2f}")
+    print(f"{'Eval time (s)':<24}{float_seconds:>14.2f}{int8_seconds:>14.2f}{int8_seconds - float_seconds:>+14.2f}")
+    print(f"\nSpeed-up: {float_seconds / max(int8_seconds, 1e-9):.2f}x on {len(val_dataset)} essays")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Registry of loaded grading models.
+
+Models are registered under a key ("default" for MODEL_PATH, or one per
+prompt/essay set from a manifest) and loaded on a background thread. A
+finished load replaces the previous version under the registry lock in one
+assignment, so the swap is atomic: requests that already resolved a model
+keep their reference and finish on it, while new requests see the new
+version. Loaded models are kept in LRU order and unpinned ones are dropped
+once their estimated memory exceeds `memory_budget_bytes`. `on_swap(key,
+backend)` runs after every change, with None when a model is unloaded or
+evicted, so callers can keep state derived from the loaded set in step.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple
+
+
+class ModelSpec(NamedTuple):
+    kind: str
+    model_path: str
+    onnx_path: str
+    precision: str = "float32"
+
+
+class _LoadedModel:
+    __slots__ = ("backend", "spec", "version", "memory_bytes", "loaded_at", "last_used", "uses")
+
+    def __init__(self, backend: Any, spec: ModelSpec, version: int):
+        self.backend = backend
+        self.spec = spec
+        self.version = version
+        self.memory_bytes = int(getattr(backend, "memory_bytes", 0))
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.uses = 0
+
+
+def load_manifest(path: str, base_spec: ModelSpec) -> tuple[Dict[str, ModelSpec], Dict[str, str]]:
+    """
+    Read per-prompt models from a JSON manifest:
+
+        {"models": {"set1": {"model_path": "models/set1.pt", "precision": "int8",
+                             "assignments": ["essay-101", "essay-102"]}}}
+
+    Unset fields fall back to `base_spec`. Returns ({key: spec}, {assignment_id: key}).
+    """
+    with open(path, "r", encoding="utf-8") as fp:
+        manifest = json.load(fp)
+
+    specs: Dict[str, ModelSpec] = {}
+    routes: Dict[str, str] = {}
+    for key, entry in manifest.get("models", {}).items():
+        specs[key] = ModelSpec(
+            kind=entry.get("backend", base_spec.kind),
+            model_path=entry.get("model_path", base_spec.model_path),
+            onnx_path=entry.get("onnx_path", base_spec.onnx_path),
+            precision=entry.get("precision", base_spec.precision),
+        )
+        for assignment_id in entry.get("assignments", []):
+            routes[str(assignment_id)] = key
+    return specs, routes
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        load: Callable[[ModelSpec], Any],
+        memory_budget_bytes: int = 0,
+        pinned: Iterable[str] = ("default",),
+        on_swap: Callable[[str, Any], None] | None = None,
+    ):
+        self._load_fn = load
+        self.memory_budget_bytes = max(0, int(memory_budget_bytes))
+        self.pinned = set(pinned)
+        self.on_swap = on_swap or (lambda key, backend: None)
+
+        self._lock = threading.Lock()
+        self._specs: Dict[str, ModelSpec] = {}
+        self._routes: Dict[str, str] = {}
+        self._models: "OrderedDict[str, _LoadedModel]" = OrderedDict()
+        self._loading: Dict[str, Future] = {}
+        self._versions: Dict[str, int] = {}
+        self._errors: Dict[str, str] = {}
+        self._evictions = 0
+        # One loader thread: loads are rare and should not compete with inference for cores.
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        # Threads do not survive fork, so a forked worker (src/serve.py) gets
+        # its own loader and lock; loaded models are inherited as they are.
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+
+    def register(self, key: str, spec: ModelSpec, assignments: Iterable[str] = ()) -> None:
+        with self._lock:
+            self._specs[key] = spec
+            for assignment_id in assignments:
+                self._routes[assignment_id] = key
+
+    def set_routes(self, routes: Dict[str, str]) -> None:
+        with self._lock:
+            self._routes.update(routes)
+
+    def key_for(self, assignment_id: str | None) -> str:
+        """Model key serving an assignment: its own model if one is registered, else "default"."""
+        if assignment_id:
+            if assignment_id in self._routes:
+                return self._routes[assignment_id]
+            if assignment_id in self._specs:
+                return assignment_id
+        return "default"
+
+    def peek(self, key: str) -> Any | None:
+        """The loaded backend for `key`, or None; marks it most recently used."""
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is None:
+                return None
+            self._models.move_to_end(key)
+            entry.last_used = time.time()
+            entry.uses += 1
+            return entry.backend
+
+    def get(self, key: str, timeout: float | None = None) -> Any:
+        """Loaded backend for `key`, loading it first (blocking) if needed."""
+        backend = self.peek(key)
+        if backend is not None:
+            return backend
+        return self.load(key).result(timeout)
+
+    def load(self, key: str) -> Future:
+        """Future for the backend of `key`; starts a background load unless it is loaded or loading."""
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                future: Future = Future()
+                future.set_result(entry.backend)
+                return future
+            return self._schedule(key, None)
+
+    def reload(self, key: str, spec: ModelSpec | None = None) -> Future:
+        """Load a new version of `key` in the background (optionally from a new spec) and swap it in."""
+        with self._lock:
+            return self._schedule(key, spec, force=True)
+
+    def unload(self, key: str) -> bool:
+        if key in self.pinned:
+            raise ValueError(f"Model '{key}' is pinned and cannot be unloaded.")
+        with self._lock:
+            unloaded = self._models.pop(key, None) is not None
+        if unloaded:
+            self.on_swap(key, None)
+        return unloaded
+
+    def spec(self, key: str) -> ModelSpec | None:
+        with self._lock:
+            return self._specs.get(key)
+
+    def checkpoint_ids(self) -> List[str]:
+        """Checkpoint ids of the loaded models, pinned models first."""
+        with self._lock:
+            entries = sorted(self._models.items(), key=lambda item: item[0] not in self.pinned)
+            return [getattr(entry.backend, "checkpoint_id", "") for _, entry in entries]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            models: List[Dict[str, Any]] = []
+            for key in sorted(set(self._specs) | set(self._models) | set(self._errors)):
+                entry = self._models.get(key)
+                spec = entry.spec if entry is not None else self._specs.get(key)
+                models.append({
+                    "key": key,
+                    "state": "loaded" if entry is not None else "unloaded",
+                    "loading": key in self._loading,
+                    "pinned": key in self.pinned,
+                    "backend": spec.kind if spec else None,
+                    "model_path": (spec.onnx_path if spec.kind == "onnx" else spec.model_path) if spec else None,
+                    "precision": spec.precision if spec else None,
+                    "version": entry.version if entry is not None else None,
+                    "checkpoint_id": getattr(entry.backend, "checkpoint_id", None) if entry is not None else None,
+                    "memory_bytes": entry.memory_bytes if entry is not None else 0,
+                    "loaded_at": entry.loaded_at if entry is not None else None,
+                    "last_used": entry.last_used if entry is not None else None,
+                    "uses": entry.uses if entry is not None else 0,
+                    "last_error": self._errors.get(key),
+                    "assignments": sorted(a for a, k in self._routes.items() if k == key),
+                })
+            return {
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "memory_bytes": sum(entry.memory_bytes for entry in self._models.values()),
+                "evictions": self._evictions,
+                "models": models,
+            }
+
+    def _schedule(self, key: str, spec: ModelSpec | None, force: bool = False) -> Future:
+        # Caller holds the lock.
+        pending = self._loading.get(key)
+        if pending is not None and not force:
+            return pending
+        spec = spec or self._specs.get(key)
+        if spec is None:
+            raise KeyError(f"Unknown model '{key}'.")
+        future = self._loader.submit(self._load, key, spec)
+        self._loading[key] = future
+        future.add_done_callback(lambda done, key=key: self._finish(key, done))
+        return future
+
+    def _finish(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+    def _load(self, key: str, spec: ModelSpec) -> Any:
+        try:
+            backend = self._load_fn(spec)
+        except Exception as exc:
+            with self._lock:
+                self._errors[key] = f"{type(exc).__name__}: {exc}"
+            raise
+
+        with self._lock:
+            version = self._versions.get(key, 0) + 1
+            self._versions[key] = version
+            # A new spec only sticks once it has loaded, so a bad path cannot break later reloads.
+            self._specs[key] = spec
+            # The swap: one dict assignment under the lock. The previous
+            # version is freed once in-flight requests drop their references.
+            self._models[key] = _LoadedModel(backend, spec, version)
+            self._models.move_to_end(key)
+            self._errors.pop(key, None)
+            evicted = self._evict(keep=key)
+        for evicted_key in evicted:
+            self.on_swap(evicted_key, None)
+        self.on_swap(key, backend)
+        return backend
+
+    def _evict(self, keep: str) -> List[str]:
+        """Unload least recently used models beyond the budget; returns their keys. Caller holds the lock."""
+        evicted: List[str] = []
+        if not self.memory_budget_bytes:
+            return evicted
+        total = sum(entry.memory_bytes for entry in self._models.values())
+        for key in list(self._models):
+            if total <= self.memory_budget_bytes:
+                break
+            if key == keep or key in self.pinned:
+                continue
+            total -= self._models.pop(key).memory_bytes
+            self._evictions += 1
+            evicted.append(key)
+        return evicted
+
@@ -0,0 +1,55 @@
+"""
+Score scaling and grade letters shared by the API and the offline tools.
+
+Kept free of serving imports so training and reporting scripts can use the
+same mapping from raw 0-60 model scores to marks and letters.
+"""
+from typing import Tuple
+
+
+def scale_score(raw_score: float, total_marks: float | None = None) -> float:
+    # Scale to total_marks if provided, otherwise return raw score
+    if total_marks is not None and total_marks > 0:
+        # Scale from 0-60 to 0-total_marks
+        scaled_score = (raw_score / 60.0) * total_marks
+        
+        # Apply bonus based on raw score (0-60 scale)
+        # If raw score > 50/60, add 10% bonus
+        # If raw score < 50/60, add 20% bonus
+        if raw_score > 50.0:
+            # 10% bonus for scores above 50
+            bonus = scaled_score * 0.10
+        else:
+            # 20% bonus for scores below 50
+            bonus = scaled_score * 0.20
+        
+        final_score = scaled_score + bonus
+        
+        # Ensure score doesn't exceed total_marks
+        return max(0.0, min(total_marks, final_score))
+    
+    # If no total_marks provided, apply bonus to raw score
+    if raw_score > 50.0:
+        bonus = raw_score * 0.10
+    else:
+        bonus = raw_score * 0.20
+    
+    final_score = raw_score + bonus
+    return max(0.0, min(60.0, final_score))
+
+
+def grade_letter_for(score: float, total_marks: float | None) -> Tuple[str | None, float | None]:
+    # Calculate grade letter and GPA if total_marks is provided
+    if not total_marks or total_marks <= 0:
+        return None, None
+
+    percentage = (score / total_marks) * 100
+    if percentage >= 90:
+        return "A", 4.0
+    elif percentage >= 80:
+        return "B", 3.0
+    elif percentage >= 70:
+        return "C", 2.0
+    elif percentage >= 60:
+        return "D", 1.0
+    return "F", 0.0
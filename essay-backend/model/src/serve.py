@@ -0,0 +1,130 @@
+"""
+Pre-fork server: load the model once, then fork uvicorn workers that share it.
+
+    python -m src.serve --workers 4 --host 0.0.0.0 --port 8000
+
+`uvicorn src.api:app --workers N` imports the app and loads the checkpoint in
+every worker, so each holds its own copy of the embedding table, LSTM weights
+and vocabulary. Here the supervisor loads the default model (and any
+`--preload` manifest models) before forking; workers inherit those pages
+copy-on-write and, since inference never writes to them, keep sharing them.
+`gc.freeze()` moves the loaded objects out of the collector's generations so
+collections in the workers do not touch (and copy) their pages. Workers share
+one listening socket and are restarted if they die.
+
+The supervisor never runs a forward pass: thread pools started before fork
+are not usable in the children, so warm-up happens in each worker.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, log_level: str) -> None:
+    import uvicorn
+
+    # Drop the supervisor's handlers; uvicorn installs its own for graceful shutdown.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+class Supervisor:
+    def __init__(self, app, sock: socket.socket, workers: int, log_level: str):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.log_level = log_level
+        self.children: set[int] = set()
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(self.app, self.sock, self.log_level)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                # Never fall back into the supervisor loop.
+                os._exit(code)
+        self.children.add(pid)
+
+    def stop(self, signum, frame) -> None:
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        print(f"Supervisor {os.getpid()} serving with {self.workers} workers: {sorted(self.children)}", flush=True)
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self.children.discard(pid)
+            if not self.stopping:
+                print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting", flush=True)
+                time.sleep(1.0)
+                self.spawn()
+        return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--preload", default="", help="comma-separated manifest models to load before forking")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    if not hasattr(os, "fork"):
+        parser.error("the pre-fork server needs os.fork; use uvicorn --workers on this platform")
+    workers = max(1, args.workers)
+
+    # Split the cores between workers unless the operator chose a budget.
+    os.environ.setdefault("INFERENCE_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+    from src import api
+
+    api.load_artifacts()
+    for key in filter(None, (key.strip() for key in args.preload.split(","))):
+        api.registry.get(key)
+
+    sock = bind_socket(args.host, args.port)
+    gc.collect()
+    gc.freeze()
+    return Supervisor(api.app, sock, workers, args.log_level).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
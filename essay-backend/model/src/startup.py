@@ -0,0 +1,63 @@
+"""
+Start-up timeline for readiness reporting.
+
+`StartupTracker` records when each start-up milestone was reached, measured
+from the start of the process so interpreter and import time are included.
+The service is ready once the model is loaded and warmed up; the first
+successful grade is recorded as well, since that is the latency an
+autoscaled pod actually adds.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict
+
+MILESTONES = ("imported", "model_loaded", "ready", "first_grade")
+
+
+def process_start_time() -> float:
+    """Wall-clock start of this process from /proc, else the current time."""
+    try:
+        with open("/proc/self/stat", "r", encoding="utf-8") as fp:
+            # Fields after the parenthesised command name; starttime is field 22 overall.
+            fields = fp.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", "r", encoding="utf-8") as fp:
+            uptime = float(fp.read().split()[0])
+        return time.time() - uptime + int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class StartupTracker:
+    def __init__(self):
+        self.started_at = process_start_time()
+        self.error: str | None = None
+        self._marks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return "ready" in self._marks and self.error is None
+
+    def mark(self, milestone: str) -> None:
+        """Record `milestone` the first time it is reached."""
+        if milestone in self._marks:
+            return
+        with self._lock:
+            self._marks.setdefault(milestone, time.time())
+
+    def fail(self, exc: BaseException) -> None:
+        self.error = f"{type(exc).__name__}: {exc}"
+
+    def seconds(self) -> Dict[str, float]:
+        """Seconds from process start to each milestone reached so far."""
+        with self._lock:
+            return {
+                f"{name}_seconds": round(self._marks[name] - self.started_at, 4)
+                for name in MILESTONES
+                if name in self._marks
+            }
+
+    def status(self) -> Dict[str, Any]:
+        state = "ready" if self.ready else "failed" if self.error else "starting"
+        return {"status": state, "error": self.error, **self.seconds()}
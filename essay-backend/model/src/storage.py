@@ -1,10 +1,25 @@
+import bisect
 import json
 import os
+import queue
+import sqlite3
 import threading
+import time
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Tuple
+
+try:  # POSIX advisory locks; Windows falls back to in-process locking only
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
 
 _lock = threading.Lock()
+_stores: Dict[str, "GradeStore"] = {}
+
+SQLITE_SUFFIXES = {".db", ".sqlite", ".sqlite3"}
+JSONL_SUFFIXES = {".jsonl", ".ndjson"}
+SYNC_POLICIES = {"batch", "interval", "none"}
 
 
 def _ensure_parent(path: Path) -> None:
@@ -21,16 +36,469 @@ def _load_records(path: Path) -> List[Dict[str, Any]]:
             return []
 
 
-def append_grade_record(record: Dict[str, Any], store_path: str) -> None:
+def _fsync_path(path: Path) -> None:
+    if not path.exists():
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class GradeStore:
+    """Append-only grade record store; every write costs O(1) in the number of saved records."""
+
+    fsync_on_commit = True
+
+    def set_durability(self, fsync_on_commit: bool) -> None:
+        """Choose whether every commit is flushed to disk before returning."""
+        self.fsync_on_commit = fsync_on_commit
+
+    def sync(self) -> None:
+        """Flush everything committed so far to stable storage."""
+        raise NotImplementedError
+
+    def append(self, record: Dict[str, Any]) -> None:
+        self.append_many([record])
+
+    def append_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def migrate_from(self, legacy_path: Path) -> int:
+        """Import a legacy JSON-array file once; returns the number of records imported."""
+        raise NotImplementedError
+
+    def query(
+        self,
+        assignment_id: str | None = None,
+        student_name: str | None = None,
+        limit: int = 50,
+        cursor: str | None = None,
+    ) -> Tuple[List[Dict[str, Any]], str | None]:
+        """
+        Return saved records newest first, optionally filtered by assignment
+        and/or student, plus an opaque cursor for the next page (None when
+        there are no more records). Lookups use secondary indexes.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteGradeStore(GradeStore):
+    """
+    Grade records in an SQLite database in WAL mode. SQLite's own locking makes
+    concurrent writers from several uvicorn workers safe.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        _ensure_parent(path)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS grades ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "record_id TEXT NOT NULL UNIQUE, "
+            "saved_at TEXT NOT NULL, "
+            "student_name TEXT NOT NULL, "
+            "assignment_id TEXT NOT NULL, "
+            "grade REAL NOT NULL, "
+            "feedback TEXT NOT NULL, "
+            "evaluation TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_grades_assignment ON grades (assignment_id, seq)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_grades_student ON grades (student_name, seq)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_grades_assignment_student ON grades (assignment_id, student_name, seq)")
+        conn.execute("CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._apply_durability(conn)
+            self._local.conn = conn
+        return conn
+
+    def _apply_durability(self, conn: sqlite3.Connection) -> None:
+        # NORMAL skips the per-commit fsync but, in WAL mode, never corrupts the
+        # database on a crash; at worst the last unsynced commits are lost.
+        conn.execute(f"PRAGMA synchronous={'FULL' if self.fsync_on_commit else 'NORMAL'}")
+
+    def set_durability(self, fsync_on_commit: bool) -> None:
+        super().set_durability(fsync_on_commit)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._apply_durability(conn)
+
+    def sync(self) -> None:
+        # With synchronous=NORMAL commits sit in the OS page cache; fsync the WAL
+        # and the main database file to make them durable.
+        _fsync_path(Path(f"{self.path}-wal"))
+        _fsync_path(self.path)
+
+    @staticmethod
+    def _row(record: Dict[str, Any]) -> tuple:
+        evaluation = record.get("evaluation")
+        return (
+            record["record_id"],
+            record["saved_at"],
+            record["student_name"],
+            record["assignment_id"],
+            float(record["grade"]),
+            record["feedback"],
+            json.dumps(evaluation) if evaluation is not None else None,
+        )
+
+    def _insert(self, conn: sqlite3.Connection, records: Iterable[Dict[str, Any]]) -> None:
+        conn.executemany(
+            "INSERT OR IGNORE INTO grades "
+            "(record_id, saved_at, student_name, assignment_id, grade, feedback, evaluation) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [self._row(record) for record in records],
+        )
+
+    def append_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._insert(conn, records)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def migrate_from(self, legacy_path: Path) -> int:
+        marker = f"migrated:{legacy_path.resolve()}"
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM store_meta WHERE key = ?", (marker,)).fetchone():
+                conn.execute("ROLLBACK")
+                return 0
+            records = _load_records(legacy_path)
+            self._insert(conn, records)
+            conn.execute("INSERT INTO store_meta (key, value) VALUES (?, ?)", (marker, str(len(records))))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return len(records)
+
+    def query(
+        self,
+        assignment_id: str | None = None,
+        student_name: str | None = None,
+        limit: int = 50,
+        cursor: str | None = None,
+    ) -> Tuple[List[Dict[str, Any]], str | None]:
+        clauses, params = [], []
+        if assignment_id is not None:
+            clauses.append("assignment_id = ?")
+            params.append(assignment_id)
+        if student_name is not None:
+            clauses.append("student_name = ?")
+            params.append(student_name)
+        if cursor is not None:
+            clauses.append("seq < ?")
+            params.append(_decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+
+        rows = self._connect().execute(
+            "SELECT seq, record_id, saved_at, student_name, assignment_id, grade, feedback, evaluation "
+            f"FROM grades {where}ORDER BY seq DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+
+        records = [
+            {
+                "record_id": row[1],
+                "saved_at": row[2],
+                "student_name": row[3],
+                "assignment_id": row[4],
+                "grade": row[5],
+                "feedback": row[6],
+                "evaluation": json.loads(row[7]) if row[7] is not None else None,
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+        return records, next_cursor
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class JsonLinesGradeStore(GradeStore):
+    """
+    One JSON record per line, appended under an exclusive file lock so
+    several processes can write to the same file.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        _ensure_parent(path)
+        # In-memory secondary indexes over record positions (seq), refreshed
+        # incrementally from the bytes appended since the last read.
+        self._index_lock = threading.Lock()
+        self._offsets: List[int] = []
+        self._by_assignment: Dict[str, List[int]] = {}
+        self._by_student: Dict[str, List[int]] = {}
+        self._by_pair: Dict[Tuple[str, str], List[int]] = {}
+        self._scanned = 0
+
+    def _refresh_index(self) -> None:
+        if not self.path.exists():
+            return
+        with self.path.open("rb") as fp:
+            fp.seek(self._scanned)
+            for line in fp:
+                if not line.endswith(b"\n"):
+                    break  # partial write still in progress
+                offset = self._scanned
+                self._scanned += len(line)
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                seq = len(self._offsets)
+                self._offsets.append(offset)
+                assignment_id = record.get("assignment_id")
+                student_name = record.get("student_name")
+                self._by_assignment.setdefault(assignment_id, []).append(seq)
+                self._by_student.setdefault(student_name, []).append(seq)
+                self._by_pair.setdefault((assignment_id, student_name), []).append(seq)
+
+    def query(
+        self,
+        assignment_id: str | None = None,
+        student_name: str | None = None,
+        limit: int = 50,
+        cursor: str | None = None,
+    ) -> Tuple[List[Dict[str, Any]], str | None]:
+        with self._index_lock:
+            self._refresh_index()
+            if assignment_id is not None and student_name is not None:
+                seqs = self._by_pair.get((assignment_id, student_name), [])
+            elif assignment_id is not None:
+                seqs = self._by_assignment.get(assignment_id, [])
+            elif student_name is not None:
+                seqs = self._by_student.get(student_name, [])
+            else:
+                seqs = range(len(self._offsets))
+
+            end = bisect.bisect_left(seqs, _decode_cursor(cursor)) if cursor is not None else len(seqs)
+            page = [seqs[i] for i in range(end - 1, max(end - limit, 0) - 1, -1)]
+            offsets = [self._offsets[seq] for seq in page]
+            has_more = end - len(page) > 0
+
+        records = []
+        with self.path.open("rb") as fp:
+            for offset in offsets:
+                fp.seek(offset)
+                records.append(json.loads(fp.readline()))
+        next_cursor = str(page[-1]) if has_more and page else None
+        return records, next_cursor
+
+    def _write_locked(self, payload: bytes, only_if_empty: bool = False) -> bool:
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            if only_if_empty and os.fstat(fd).st_size > 0:
+                return False
+            view = memoryview(payload)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+            if self.fsync_on_commit:
+                os.fsync(fd)
+            return True
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _encode(records: Iterable[Dict[str, Any]]) -> bytes:
+        return "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+
+    def append_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        payload = self._encode(records)
+        if payload:
+            with _lock:
+                self._write_locked(payload)
+
+    def sync(self) -> None:
+        _fsync_path(self.path)
+
+    def migrate_from(self, legacy_path: Path) -> int:
+        # Only seeds an empty store, so the import happens exactly once.
+        records = _load_records(legacy_path)
+        if not records:
+            return 0
+        with _lock:
+            return len(records) if self._write_locked(self._encode(records), only_if_empty=True) else 0
+
+
+class GroupCommitWriter:
     """
-    Append a grade record to the JSON store located at store_path.
-    The file is created if it does not exist.
+    Write-behind queue in front of a GradeStore. Records submitted within
+    `window_ms` of each other (up to `max_batch`) are written in one commit,
+    and each submitter's future resolves only once its batch is committed.
+
+    sync_policy controls durability: "batch" flushes to disk on every commit,
+    "interval" flushes at most every `sync_interval` seconds and "none" leaves
+    flushing to the operating system.
     """
+
+    def __init__(
+        self,
+        store: GradeStore,
+        window_ms: float = 2.0,
+        max_batch: int = 256,
+        sync_policy: str = "batch",
+        sync_interval: float = 1.0,
+    ):
+        if sync_policy not in SYNC_POLICIES:
+            raise ValueError(f"Unknown sync policy '{sync_policy}'. Expected one of {sorted(SYNC_POLICIES)}.")
+        self.store = store
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self.sync_policy = sync_policy
+        self.sync_interval = sync_interval
+        self.store.set_durability(sync_policy == "batch")
+
+        self._queue: "queue.Queue[Tuple[Dict[str, Any], Future] | None]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="grade-writer", daemon=True)
+        self._last_sync = time.monotonic()
+        self._dirty = False
+        self.commits = 0
+        self.records = 0
+        self._thread.start()
+
+    def submit(self, record: Dict[str, Any]) -> Future:
+        future: Future = Future()
+        self._queue.put((record, future))
+        return future
+
+    def close(self) -> None:
+        """Commit everything still queued, flush to disk and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _collect(self, first: Tuple[Dict[str, Any], Future]) -> Tuple[List[Tuple[Dict[str, Any], Future]], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _commit(self, batch: List[Tuple[Dict[str, Any], Future]]) -> None:
+        try:
+            self.store.append_many([record for record, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        self.commits += 1
+        self.records += len(batch)
+        self._dirty = True
+        for _, future in batch:
+            future.set_result(None)
+
+    def _maybe_sync(self, force: bool = False) -> None:
+        if not self._dirty or self.sync_policy == "none":
+            return
+        if self.sync_policy == "batch":
+            self._dirty = False
+            return
+        if force or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.store.sync()
+            self._last_sync = time.monotonic()
+            self._dirty = False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=max(self.sync_interval, 0.01))
+            except queue.Empty:
+                self._maybe_sync()
+                continue
+            if item is None:
+                break
+            batch, stopping = self._collect(item)
+            self._commit(batch)
+            self._maybe_sync()
+        self._maybe_sync(force=True)
+
+
+def _decode_cursor(cursor: str) -> int:
+    try:
+        value = int(cursor)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid cursor '{cursor}'.") from None
+    if value < 0:
+        raise ValueError(f"Invalid cursor '{cursor}'.")
+    return value
+
+
+def _resolve_store(store_path: str) -> tuple:
     path = Path(store_path)
+    suffix = path.suffix.lower()
+    if suffix in SQLITE_SUFFIXES:
+        return SQLiteGradeStore, path, None
+    if suffix in JSONL_SUFFIXES:
+        return JsonLinesGradeStore, path, None
+    if suffix == ".json":
+        # Legacy JSON-array path: keep its location but store in SQLite next to it.
+        return SQLiteGradeStore, path.with_suffix(".db"), path
+    raise ValueError(
+        f"Unsupported grade store '{store_path}'. Use a .db/.sqlite file (SQLite) or a .jsonl file (JSON Lines)."
+    )
+
+
+def open_grade_store(store_path: str, legacy_path: str | None = None) -> GradeStore:
+    """
+    Return the store for store_path, creating it on first use. The backend is
+    chosen by file suffix: .db/.sqlite/.sqlite3 for SQLite, .jsonl/.ndjson for
+    JSON Lines. A legacy .json path is served by an SQLite database beside it.
+    Records from the legacy JSON file (legacy_path, or the .json store_path
+    itself) are imported once.
+    """
     with _lock:
-        _ensure_parent(path)
-        records = _load_records(path)
-        records.append(record)
-        with path.open("w", encoding="utf-8") as fp:
-            json.dump(records, fp, indent=2)
+        store = _stores.get(store_path)
+    if store is not None:
+        return store
+
+    store_cls, path, implied_legacy = _resolve_store(store_path)
+    store = store_cls(path)
+    legacy = Path(legacy_path) if legacy_path else implied_legacy
+    if legacy is not None and legacy.exists() and legacy != path:
+        store.migrate_from(legacy)
+
+    with _lock:
+        return _stores.setdefault(store_path, store)
 
+
+def append_grade_record(record: Dict[str, Any], store_path: str) -> None:
+    """
+    Append a grade record to the store located at store_path.
+    The store is created if it does not exist.
+    """
+    open_grade_store(store_path).append(record)
@@ -0,0 +1,99 @@
+"""
+Pre-tokenized training corpus cache.
+
+Each split is encoded once into three raw little-endian arrays: `ids.bin`
+(every essay's truncated token ids concatenated, int32), `offsets.bin` (n + 1
+row boundaries, int64) and `scores.bin` (float32). Splits are written chunk by
+chunk, so building the cache never holds the whole corpus in memory. They live in a directory keyed by the source
+file, the vocabulary, `max_len` and the split parameters, so a new vocab,
+edited TSV or different train/val split gets a fresh cache. `MemmapEssayDataset` maps the files read-only, so DataLoader workers
+share the same pages instead of each holding copies of the essay strings.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from src.cache import file_digest
+from src.dataset import MemmapEssayDataset
+from src.vocab import simple_tokenizer
+
+CACHE_FORMAT_VERSION = 2
+IDS_DTYPE = np.dtype("<i4")
+OFFSETS_DTYPE = np.dtype("<i8")
+SCORES_DTYPE = np.dtype("<f4")
+
+
+def vocab_digest(vocab):
+    """SHA-256 of the word -> id mapping."""
+    payload = json.dumps(vocab.word2idx, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def token_cache_dir(cache_root, source_path, vocab, max_len, test_size=0.2, random_state=42):
+    digest = hashlib.sha256()
+    parts = (CACHE_FORMAT_VERSION, file_digest(source_path), vocab_digest(vocab), max_len, float(test_size), random_state)
+    for part in map(str, parts):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return Path(cache_root) / digest.hexdigest()[:32]
+
+
+def encode_chunk(texts, vocab, max_len):
+    """Encode essays into (concatenated int32 ids, per-essay lengths)."""
+    encoded = [vocab.lookup(simple_tokenizer(text)[:max_len]) for text in texts]
+    lengths = np.fromiter((len(ids) for ids in encoded), dtype=np.int64, count=len(encoded))
+    ids = np.concatenate(encoded) if encoded else np.zeros(0, dtype=np.int32)
+    return ids.astype(IDS_DTYPE, copy=False), lengths
+
+
+def write_split(directory, name, chunks, vocab, max_len):
+    """Append every (texts, scores) chunk of a split to its raw array files."""
+    prefix = Path(directory) / name
+    with open(f"{prefix}.ids.bin", "wb") as ids_fp, open(f"{prefix}.offsets.bin", "wb") as offsets_fp, \
+            open(f"{prefix}.scores.bin", "wb") as scores_fp:
+        total = 0
+        offsets_fp.write(np.zeros(1, dtype=OFFSETS_DTYPE).tobytes())
+        for texts, scores in chunks:
+            ids, lengths = encode_chunk(texts, vocab, max_len)
+            ids_fp.write(ids.tobytes())
+            offsets_fp.write((total + np.cumsum(lengths)).astype(OFFSETS_DTYPE).tobytes())
+            scores_fp.write(np.asarray(scores, dtype=SCORES_DTYPE).tobytes())
+            total += int(lengths.sum())
+
+
+def load_or_build(cache_root, source_path, vocab, max_len, load_splits, test_size=0.2, random_state=42):
+    """
+    Return {split name: MemmapEssayDataset} for the cache matching
+    (source_path, vocab, max_len, test_size, random_state), the last two being
+    the parameters `load_splits` splits with. On a miss, `load_splits()` is called for a
+    {name: iterable of (texts, scores) chunks} dict and every split is
+    streamed to disk; the
+    directory is renamed into place only once complete, so concurrent or
+    interrupted builds never leave a partial cache behind.
+    """
+    directory = token_cache_dir(cache_root, source_path, vocab, max_len, test_size, random_state)
+    if not directory.exists():
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".building-", dir=directory.parent))
+        try:
+            splits = load_splits()
+            for name, chunks in splits.items():
+                write_split(staging, name, chunks, vocab, max_len)
+            with open(staging / "meta.json", "w", encoding="utf-8") as fp:
+                json.dump({"source": str(source_path), "max_len": max_len, "splits": sorted(splits)}, fp)
+            os.rename(staging, directory)
+        except OSError:
+            # Another process finished the same cache first.
+            if not directory.exists():
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    with open(directory / "meta.json", "r", encoding="utf-8") as fp:
+        names = json.load(fp)["splits"]
+    return {name: MemmapEssayDataset(directory / name) for name in names}
@@ -1,103 +1,241 @@
 import os
 import torch
+import torch.distributed as dist
 import torch.nn as nn
 import torch.optim as optim
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data import DataLoader
 import numpy as np
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 
-from src.data_loader import load_dataset
-from src.dataset import Vocab, EssayDataset
+from src.data_loader import iter_split, iter_split_texts
+from src.dataset import Vocab, LengthBucketSampler, collate_essays
 from src.deep_model import EssayCNNBiLSTM
+from src.token_cache import load_or_build
+from src.training_monitor import TrainingMonitor
+
+TOKEN_CACHE_DIR = os.getenv("TOKEN_CACHE_DIR", "data/token_cache")
+# Workers read the memory-mapped token cache, so they share pages instead of copying essays.
+# Per rank: under torchrun the host's cores are split between its LOCAL_WORLD_SIZE ranks.
+NUM_WORKERS = int(os.getenv(
+    "NUM_WORKERS", str(min(4, (os.cpu_count() or 1) // max(1, int(os.getenv("LOCAL_WORLD_SIZE", "1")))))
+))
+# Process-group backend for `torchrun` launches; gloo runs on CPU across processes and hosts
+DIST_BACKEND = os.getenv("DIST_BACKEND", "gloo")
+# Per-epoch throughput log; defaults to <checkpoint>.metrics.json
+TRAIN_METRICS_PATH = os.getenv("TRAIN_METRICS_PATH", "")
+# Set to a directory to write a torch.profiler trace of steps [wait + warmup, wait + warmup + active)
+TRAIN_PROFILE_DIR = os.getenv("TRAIN_PROFILE_DIR", "")
+TRAIN_PROFILE_WAIT = int(os.getenv("TRAIN_PROFILE_WAIT", "1"))
+TRAIN_PROFILE_WARMUP = int(os.getenv("TRAIN_PROFILE_WARMUP", "1"))
+TRAIN_PROFILE_ACTIVE = int(os.getenv("TRAIN_PROFILE_ACTIVE", "5"))
+# Also record tensor shapes and allocations in the trace (much larger and slower)
+TRAIN_PROFILE_DETAILS = os.getenv("TRAIN_PROFILE_DETAILS", "0") == "1"
+
+
+def init_distributed():
+    """
+    Join the process group when launched by torchrun, e.g.
+
+        torchrun --nproc_per_node=4 -m src.train
+        torchrun --nnodes=2 --node_rank=0 --master_addr=10.0.0.1 --master_port=29500 \
+            --nproc_per_node=8 -m src.train
+
+    Returns (rank, world_size, local_rank); a plain `python -m src.train` run is (0, 1, 0).
+    """
+    world_size = int(os.getenv("WORLD_SIZE", "1"))
+    if world_size <= 1:
+        return 0, 1, 0
+
+    dist.init_process_group(backend=DIST_BACKEND)
+    # Split the host's cores between the ranks running on it
+    local_world_size = int(os.getenv("LOCAL_WORLD_SIZE", "1"))
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world_size))
+    return dist.get_rank(), dist.get_world_size(), int(os.getenv("LOCAL_RANK", "0"))
+
+
+def _is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+
+def _broadcast_value(value, src=0):
+    tensor = torch.tensor([value], dtype=torch.float64)
+    dist.broadcast(tensor, src=src)
+    return tensor.item()
+
+
+def _mean_across_ranks(value):
+    tensor = torch.tensor([value], dtype=torch.float64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor.item() / dist.get_world_size()
+
+
+def _sum_across_ranks(value):
+    tensor = torch.tensor([value], dtype=torch.float64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor.item()
+
+
+def train_model(model, train_loader, val_loader, device, epochs=3, lr=2e-3, monitor=None):
+    """
+    Train `model` in place and return it. Under torchrun the model is wrapped in
+    DistributedDataParallel, which averages gradients across ranks; only rank 0
+    validates and logs (`val_loader` may be None elsewhere) and its validation
+    loss is broadcast so every rank steps the scheduler and stops together.
+
+    `monitor` (a TrainingMonitor) records per-epoch throughput, phase timings
+    and peak memory; one without a log path is used if none is given.
+    """
+    distributed = _is_distributed()
+    is_main = not distributed or dist.get_rank() == 0
+    monitor = monitor or TrainingMonitor(device)
 
-def train_model(model, train_loader, val_loader, device, epochs=3, lr=2e-3):
     criterion = nn.MSELoss()
     optimizer = optim.AdamW(model.parameters(), lr=lr, weight_decay=1e-4)
     scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=2)
 
     model.to(device)
+    train_module = DistributedDataParallel(model) if distributed else model
     best_val_loss = float('inf')
     patience_counter = 0
 
-    for epoch in range(epochs):
-        model.train()
-        total_loss = 0
-        for essays, scores in train_loader:
+    with monitor:
+        for epoch in range(epochs):
+            avg_val_loss = _train_epoch(
+                model, train_module, train_loader, val_loader, criterion, optimizer, device, monitor,
+                epoch, epochs, distributed, is_main,
+            )
+
+            # Learning rate scheduling
+            scheduler.step(avg_val_loss)
+
+            # Early stopping (but with small patience to keep training fast)
+            if avg_val_loss < best_val_loss:
+                best_val_loss = avg_val_loss
+                patience_counter = 0
+            else:
+                patience_counter += 1
+                if patience_counter >= 2:  # Early stop after 2 epochs without improvement
+                    if is_main:
+                        print("Early stopping triggered.")
+                    break
+
+    return model
+
+
+def _train_epoch(model, train_module, train_loader, val_loader, criterion, optimizer, device, monitor,
+                 epoch, epochs, distributed, is_main):
+    """Run one training epoch plus validation; returns the (rank 0) validation loss."""
+    monitor.start_epoch()
+    train_module.train()
+    total_loss = 0
+    for essays, lengths, scores in monitor.iter_batches(train_loader):
+        with monitor.phase("forward"):
             essays, scores = essays.to(device), scores.to(device)
 
             optimizer.zero_grad()
-            outputs = model(essays)
+            outputs = train_module(essays, lengths).reshape(-1)
             loss = criterion(outputs, scores)
+        with monitor.phase("backward"):
             loss.backward()
+        with monitor.phase("optimizer"):
             # Gradient clipping for stability
             torch.nn.utils.clip_grad_norm_(model.parameters(), max_norm=1.0)
             optimizer.step()
 
-            total_loss += loss.item()
-
-        avg_train_loss = total_loss / len(train_loader)
-
-        # Validation
-        model.eval()
-        val_loss = 0
-        all_preds = []
-        all_scores = []
-        with torch.no_grad():
-            for essays, scores in val_loader:
-                essays, scores = essays.to(device), scores.to(device)
-                outputs = model(essays)
-                loss = criterion(outputs, scores)
-                val_loss += loss.item()
-                all_preds.extend(outputs.cpu().numpy())
-                all_scores.extend(scores.cpu().numpy())
-
-        avg_val_loss = val_loss / len(val_loader)
-        
-        # Calculate metrics
-        rmse = np.sqrt(mean_squared_error(all_scores, all_preds))
-        mae = mean_absolute_error(all_scores, all_preds)
-        
+        total_loss += loss.item()
+        monitor.step(len(scores))
+
+    avg_train_loss = total_loss / len(train_loader)
+    samples = None
+    if distributed:
+        avg_train_loss = _mean_across_ranks(avg_train_loss)
+        samples = int(_sum_across_ranks(monitor.samples))
+
+    # Validation (rank 0 only)
+    avg_val_loss = 0.0
+    metrics = {"train_loss": avg_train_loss}
+    if is_main:
+        with monitor.phase("validation"):
+            model.eval()
+            val_loss = 0
+            all_preds = []
+            all_scores = []
+            with torch.no_grad():
+                for essays, lengths, scores in val_loader:
+                    essays, scores = essays.to(device), scores.to(device)
+                    outputs = model(essays, lengths).reshape(-1)
+                    loss = criterion(outputs, scores)
+                    val_loss += loss.item()
+                    all_preds.extend(outputs.cpu().numpy())
+                    all_scores.extend(scores.cpu().numpy())
+
+            avg_val_loss = val_loss / len(val_loader)
+
+            # Calculate metrics
+            rmse = np.sqrt(mean_squared_error(all_scores, all_preds))
+            mae = mean_absolute_error(all_scores, all_preds)
+        metrics.update(val_loss=avg_val_loss, rmse=rmse, mae=mae)
+
+    record = monitor.end_epoch(epoch + 1, samples=samples, **metrics)
+    if is_main:
         print(f"Epoch {epoch+1}/{epochs} | Train Loss: {avg_train_loss:.4f} | Val Loss: {avg_val_loss:.4f} | RMSE: {rmse:.4f} | MAE: {mae:.4f}")
-        
-        # Learning rate scheduling
-        scheduler.step(avg_val_loss)
-        
-        # Early stopping (but with small patience to keep training fast)
-        if avg_val_loss < best_val_loss:
-            best_val_loss = avg_val_loss
-            patience_counter = 0
-        else:
-            patience_counter += 1
-            if patience_counter >= 2:  # Early stop after 2 epochs without improvement
-                print("Early stopping triggered.")
-                break
+        print(monitor.summary(record))
 
-    return model
+    if distributed:
+        avg_val_loss = _broadcast_value(avg_val_loss)
+    return avg_val_loss
 
 def main():
     data_path = "data/training_set_rel3.tsv"
     model_path = "models/deep_essay_grader.pt"
+    rank, world_size, local_rank = init_distributed()
+    is_main = rank == 0
 
-    # 1. Load dataset
-    print("Loading dataset...")
-    X_train, X_val, y_train, y_val = load_dataset(data_path)
-    print(f"Train samples: {len(X_train)}, Val samples: {len(X_val)}")
-
-    # 2. Build vocab
-    print("Building vocabulary...")
+    # 1. Build vocab - the training split is streamed in chunks and counted across a process pool
+    if is_main:
+        print("Building vocabulary...")
     vocab = Vocab(min_freq=2)
-    vocab.build_vocab(X_train)
-    print(f"Vocabulary size: {len(vocab)}")
+    if is_main:
+        vocab.build_vocab_parallel(iter_split_texts(data_path, "train"))
+        print(f"Vocabulary size: {len(vocab)}")
+    if world_size > 1:
+        # Every rank must use rank 0's ids
+        shared = [vocab.word2idx]
+        dist.broadcast_object_list(shared, src=0)
+        vocab.word2idx = shared[0]
+        vocab.idx2word = {idx: word for word, idx in vocab.word2idx.items()}
 
-    # 3. Create datasets
-    train_dataset = EssayDataset(X_train, y_train, vocab, max_len=300)
-    val_dataset = EssayDataset(X_val, y_val, vocab, max_len=300)
+    # 2. Create datasets - essays are tokenized once into a memory-mapped cache,
+    # built by the first rank on each host while the others wait
+    def load_splits():
+        if is_main:
+            print("Loading dataset...")
+        return {"train": iter_split(data_path, "train"), "val": iter_split(data_path, "val")}
 
-    # 4. DataLoaders - increased batch size for faster training
-    train_loader = DataLoader(train_dataset, batch_size=64, shuffle=True, num_workers=0)
-    val_loader = DataLoader(val_dataset, batch_size=64, num_workers=0)
+    if local_rank == 0:
+        splits = load_or_build(TOKEN_CACHE_DIR, data_path, vocab, max_len=300, load_splits=load_splits)
+    if world_size > 1:
+        dist.barrier()
+    if local_rank != 0:
+        splits = load_or_build(TOKEN_CACHE_DIR, data_path, vocab, max_len=300, load_splits=load_splits)
+    train_dataset, val_dataset = splits["train"], splits["val"]
+    if is_main:
+        print(f"Train samples: {len(train_dataset)}, Val samples: {len(val_dataset)}")
+
+    # 3. DataLoaders - batches are bucketed by length and padded dynamically;
+    # each rank trains on its own shard of the batches
+    train_sampler = LengthBucketSampler(
+        train_dataset.lengths(), batch_size=64, shuffle=True, num_replicas=world_size, rank=rank
+    )
+    loader_options = {"collate_fn": collate_essays, "num_workers": NUM_WORKERS, "persistent_workers": NUM_WORKERS > 0}
+    train_loader = DataLoader(train_dataset, batch_sampler=train_sampler, **loader_options)
+    val_loader = None
+    if is_main:
+        val_sampler = LengthBucketSampler(val_dataset.lengths(), batch_size=64, shuffle=False)
+        val_loader = DataLoader(val_dataset, batch_sampler=val_sampler, **loader_options)
 
-    # 5. Initialize model - improved architecture
+    # 4. Initialize model - improved architecture
     model = EssayCNNBiLSTM(
         vocab_size=len(vocab), 
         embed_dim=128, 
@@ -107,19 +245,47 @@ def main():
     )
     
     # Count parameters
-    total_params = sum(p.numel() for p in model.parameters())
-    trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
-    print(f"Model parameters: {total_params:,} (trainable: {trainable_params:,})")
-
-    # 6. Train
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Using device: {device}")
-    model = train_model(model, train_loader, val_loader, device, epochs=3, lr=2e-3)
-
-    # 7. Save model + vocab
-    os.makedirs("models", exist_ok=True)
-    torch.save({"model_state": model.state_dict(), "vocab": vocab.word2idx}, model_path)
-    print(f"Model saved to {model_path}")
+    if is_main:
+        total_params = sum(p.numel() for p in model.parameters())
+        trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
+        print(f"Model parameters: {total_params:,} (trainable: {trainable_params:,})")
+
+    # 5. Train
+    if world_size > 1:
+        # gloo all-reduces CPU tensors
+        device = torch.device("cpu")
+        print(f"Rank {rank}/{world_size} using {torch.get_num_threads()} threads")
+    else:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        print(f"Using device: {device}")
+    monitor = TrainingMonitor(
+        device,
+        log_path=(TRAIN_METRICS_PATH or os.path.splitext(model_path)[0] + ".metrics.json") if is_main else None,
+        profile_dir=TRAIN_PROFILE_DIR or None,
+        profile_wait=TRAIN_PROFILE_WAIT,
+        profile_warmup=TRAIN_PROFILE_WARMUP,
+        profile_active=TRAIN_PROFILE_ACTIVE,
+        profile_details=TRAIN_PROFILE_DETAILS,
+        run_info={
+            "world_size": world_size,
+            "num_workers": NUM_WORKERS,
+            "batch_size": 64,
+            "train_samples": len(train_dataset),
+            "val_samples": len(val_dataset),
+            "vocab_size": len(vocab),
+        },
+    )
+    model = train_model(model, train_loader, val_loader, device, epochs=3, lr=2e-3, monitor=monitor)
+
+    # 6. Save model + vocab
+    if is_main:
+        os.makedirs("models", exist_ok=True)
+        # Trained on iter_split's rows, so tools re-deriving the validation set use the same scheme.
+        torch.save({"model_state": model.state_dict(), "vocab": vocab.word2idx, "split_scheme": "hash"}, model_path)
+        print(f"Model saved to {model_path}")
+
+    if world_size > 1:
+        dist.destroy_process_group()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,171 @@
+"""
+Training throughput instrumentation.
+
+`TrainingMonitor` times each phase of a training step (data loading, forward,
+backward, optimizer) plus validation, and counts samples and peak memory per
+epoch. Epoch records are rewritten to a JSON log after every epoch so runs can
+be compared. With `profile_dir` set, a `torch.profiler` trace of a window of
+steps is written there (open with TensorBoard or chrome://tracing).
+"""
+import json
+import os
+import platform
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+import torch
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PHASES = ("data", "forward", "backward", "optimizer", "validation")
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB (None if unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1 << 20) if platform.system() == "Darwin" else peak / 1024
+
+
+class TrainingMonitor:
+    def __init__(self, device, log_path=None, profile_dir=None, profile_wait=1, profile_warmup=1,
+                 profile_active=5, profile_details=False, run_info=None):
+        self.device = torch.device(device)
+        self.log_path = log_path
+        self.profile_dir = profile_dir
+        self.profile_schedule = (profile_wait, profile_warmup, profile_active)
+        # Shapes and allocator events make LSTM traces many times larger; off by default
+        self.profile_details = profile_details
+        self.run_info = dict(run_info or {})
+        self.created_at = datetime.utcnow().isoformat()
+        self.epochs = []
+        self._profiler = None
+        self._start_epoch_state()
+
+    def _start_epoch_state(self):
+        self._phase_seconds = defaultdict(float)
+        self._samples = 0
+        self._steps = 0
+        self._epoch_start = time.perf_counter()
+
+    def _synchronize(self):
+        # CUDA kernels run asynchronously; wait so time lands in the right phase
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+
+    def __enter__(self):
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if self.device.type == "cuda":
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            wait, warmup, active = self.profile_schedule
+            self._profiler = torch.profiler.profile(
+                activities=activities,
+                schedule=torch.profiler.schedule(wait=wait, warmup=warmup, active=active, repeat=1),
+                on_trace_ready=torch.profiler.tensorboard_trace_handler(self.profile_dir),
+                record_shapes=self.profile_details,
+                profile_memory=self.profile_details,
+            )
+            self._profiler.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._profiler is not None:
+            self._profiler.__exit__(*exc_info)
+            self._profiler = None
+        return False
+
+    def start_epoch(self):
+        self._synchronize()
+        if self.device.type == "cuda":
+            torch.cuda.reset_peak_memory_stats(self.device)
+        self._start_epoch_state()
+
+    @contextmanager
+    def phase(self, name):
+        label = torch.profiler.record_function(name) if self._profiler is not None else nullcontext()
+        start = time.perf_counter()
+        with label:
+            yield
+            self._synchronize()
+        self._phase_seconds[name] += time.perf_counter() - start
+
+    def iter_batches(self, loader):
+        """Iterate `loader`, charging the wait for each batch to the "data" phase."""
+        batches = iter(loader)
+        while True:
+            with self.phase("data"):
+                batch = next(batches, None)
+            if batch is None:
+                return
+            yield batch
+
+    @property
+    def samples(self):
+        """Samples seen so far this epoch."""
+        return self._samples
+
+    def step(self, batch_size):
+        self._samples += batch_size
+        self._steps += 1
+        if self._profiler is not None:
+            self._profiler.step()
+
+    def end_epoch(self, epoch, samples=None, **metrics):
+        """
+        Close the epoch and append its record. `samples` overrides the local
+        count, e.g. with the total across distributed ranks.
+        """
+        self._synchronize()
+        seconds = time.perf_counter() - self._epoch_start
+        samples = self._samples if samples is None else samples
+        train_seconds = seconds - self._phase_seconds.get("validation", 0.0)
+        record = {
+            "epoch": epoch,
+            "steps": self._steps,
+            "samples": samples,
+            "seconds": round(seconds, 4),
+            "samples_per_sec": round(samples / train_seconds, 2) if train_seconds > 0 else None,
+            "phase_seconds": {name: round(self._phase_seconds.get(name, 0.0), 4) for name in PHASES},
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        if self.device.type == "cuda":
+            record["peak_cuda_mb"] = torch.cuda.max_memory_allocated(self.device) / (1 << 20)
+        record.update({key: float(value) for key, value in metrics.items()})
+        self.epochs.append(record)
+        self.write_log()
+        return record
+
+    def summary(self, record):
+        phases = record["phase_seconds"]
+        parts = " ".join(f"{name}={phases[name]:.1f}s" for name in PHASES)
+        rss = record["peak_rss_mb"]
+        memory = f" | peak RSS {rss:.0f} MB" if rss is not None else ""
+        return f"  {record['samples_per_sec'] or 0:.1f} samples/s | {parts}{memory}"
+
+    def write_log(self):
+        if not self.log_path:
+            return
+        directory = os.path.dirname(self.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        payload = {
+            "created_at": self.created_at,
+            "device": str(self.device),
+            "torch_version": torch.__version__,
+            "num_threads": torch.get_num_threads(),
+            **self.run_info,
+            "epochs": self.epochs,
+        }
+        tmp_path = f"{self.log_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fp:
+            json.dump(payload, fp, indent=2)
+        os.replace(tmp_path, self.log_path)
@@ -0,0 +1,86 @@
+import os
+import re
+from collections import Counter, deque
+from itertools import repeat
+from multiprocessing import Pool
+
+import numpy as np
+
+
+def simple_tokenizer(text):
+    """Very basic tokenizer: lowercase + split by non-alphabetic."""
+    text = text.lower()
+    tokens = re.findall(r"[a-zA-Z']+", text)
+    return tokens
+
+class Vocab:
+    def __init__(self, min_freq=2):
+        self.word2idx = {"<PAD>": 0, "<UNK>": 1}
+        self.idx2word = {0: "<PAD>", 1: "<UNK>"}
+        self.min_freq = min_freq
+
+    def build_vocab(self, texts):
+        self._add_counts(count_tokens(texts))
+
+    def build_vocab_parallel(self, chunks, processes=None, max_pending=None):
+        """
+        Count tokens of an iterable of text chunks across a process pool and
+        merge the per-chunk Counters in chunk order, so ids match `build_vocab`
+        over the concatenated texts. At most `max_pending` chunks are in flight,
+        keeping memory flat for streamed corpora.
+        """
+        processes = processes or os.cpu_count() or 1
+        if processes <= 1:
+            counter = Counter()
+            for chunk in chunks:
+                counter.update(count_tokens(chunk))
+            self._add_counts(counter)
+            return
+
+        max_pending = max_pending or 2 * processes
+        counter = Counter()
+        pending = deque()
+        with Pool(processes) as pool:
+            for chunk in chunks:
+                pending.append(pool.apply_async(count_tokens, (chunk,)))
+                if len(pending) >= max_pending:
+                    counter.update(pending.popleft().get())
+            while pending:
+                counter.update(pending.popleft().get())
+        self._add_counts(counter)
+
+    def _add_counts(self, counter):
+        for word, freq in counter.items():
+            if freq >= self.min_freq and word not in self.word2idx:
+                idx = len(self.word2idx)
+                self.word2idx[word] = idx
+                self.idx2word[idx] = word
+
+    def encode(self, text):
+        tokens = simple_tokenizer(text)
+        return [self.word2idx.get(tok, self.word2idx["<UNK>"]) for tok in tokens]
+
+    def lookup(self, tokens):
+        """Map already-tokenized words to a compact int32 id array."""
+        unk = self.word2idx["<UNK>"]
+        return np.fromiter(map(self.word2idx.get, tokens, repeat(unk)), dtype=np.int32, count=len(tokens))
+
+    def __len__(self):
+        return len(self.word2idx)
+
+
+def count_tokens(texts):
+    counter = Counter()
+    for text in texts:
+        counter.update(simple_tokenizer(text))
+    return counter
+
+
+def pad_ids(sequences, pad_value=0):
+    """NumPy counterpart of dataset.pad_sequences for torch-free serving."""
+    lengths = np.fromiter((len(seq) for seq in sequences), dtype=np.int64, count=len(sequences))
+    width = max(int(lengths.max()) if len(sequences) else 0, 1)
+    padded = np.full((len(sequences), width), pad_value, dtype=np.int64)
+    for row, seq in enumerate(sequences):
+        padded[row, :len(seq)] = seq
+    return padded, lengths
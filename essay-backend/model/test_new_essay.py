@@ -36,16 +36,14 @@ def grade_essay(text, model, vocab, device, max_len=300):
     # Encode the essay
     encoded = vocab.encode(cleaned)
     
-    # Pad or truncate to max_len
-    if len(encoded) < max_len:
-        encoded += [0] * (max_len - len(encoded))
-    else:
-        encoded = encoded[:max_len]
+    # Truncate to max_len; a single essay needs no padding
+    encoded = encoded[:max_len] or [0]
     
     # Convert to tensor and predict
     tensor = torch.tensor([encoded], dtype=torch.long, device=device)
+    lengths = torch.tensor([len(encoded)], dtype=torch.long)
     with torch.no_grad():
-        pred = model(tensor).item()
+        pred = model(tensor, lengths).item()
     
     # Model outputs scores on 0-60 scale (based on training data)
     score = max(0.0, min(60.0, float(pred)))